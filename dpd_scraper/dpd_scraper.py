@@ -1,15 +1,26 @@
 from __future__ import annotations
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Optional, List, Dict, Tuple, Any, Iterator, Iterable, Collection
 
-import os, time, re, json, string
+import os, sys, time, re, string, sqlite3, threading, zlib, gzip, glob, csv
 from urllib.parse import urljoin
+from collections import deque
+from functools import lru_cache
+from operator import itemgetter
+from itertools import islice
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 from dotenv import load_dotenv
 
+import orjson
 import requests
 from requests.exceptions import ReadTimeout, ConnectTimeout, Timeout, HTTPError
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString
+from lxml import html as lxml_html
+from lxml.etree import XPath, ParserError
 import pandas as pd
 
 load_dotenv()
@@ -32,6 +43,8 @@ DEF_TARGET_MIN_ROWS    = int(os.getenv("SCRAPER_TARGET_MIN_ROWS", "2000"))
 DEF_ENRICH_FLUSH_EVERY = int(os.getenv("SCRAPER_ENRICH_FLUSH_EVERY", "50"))
 DEF_REQUEST_SLEEP      = float(os.getenv("SCRAPER_REQUEST_SLEEP", "0.05"))
 DEF_MAX_ROWS           = int(os.getenv("SCRAPER_MAX_ROWS", "0"))
+DEF_DETAIL_WORKERS     = int(os.getenv("SCRAPER_DETAIL_WORKERS", "4"))   # threads fetching detail pages
+DEF_PARSE_PROCS        = int(os.getenv("SCRAPER_PARSE_PROCS", "0"))      # processes parsing them; 0 = parse in the fetch thread
 
 SCRAPER_SWEEP_ORDER       = (os.getenv("SCRAPER_SWEEP_ORDER", "brand-first") or "brand-first").strip().lower()
 
@@ -55,6 +68,15 @@ DEBUG_PRINT_SAMPLE_EVERY  = int(os.getenv("SCRAPER_DEBUG_PRINT_SAMPLE_EVERY", "5
 SCRAPER_CHECKPOINT_EVERY_ROWS = int(os.getenv("SCRAPER_CHECKPOINT_EVERY_ROWS", "2000"))  # 0 = off
 SCRAPER_CHECKPOINT_DIR        = os.getenv("SCRAPER_CHECKPOINT_DIR", "artifacts/checkpoints")
 SCRAPER_CHECKPOINT_PREFIX     = os.getenv("SCRAPER_CHECKPOINT_PREFIX", "dpd")
+SCRAPER_CHECKPOINT_FORMAT     = (os.getenv("SCRAPER_CHECKPOINT_FORMAT", "jsonl.gz") or "jsonl.gz").strip().lower()  # "jsonl.gz" | "csv"
+
+# --- Detail page cache (sqlite) ---
+SCRAPER_DETAIL_CACHE          = os.getenv("SCRAPER_DETAIL_CACHE", "")  # e.g. artifacts/checkpoints/htmlcache.sqlite; "" = off
+SCRAPER_DETAIL_CACHE_TTL      = int(os.getenv("SCRAPER_DETAIL_CACHE_TTL", str(7 * 24 * 3600)))  # seconds; 0 = never expire
+
+# --- Detail request rate limit (token bucket, shared by all detail workers) ---
+SCRAPER_DETAIL_RATE           = float(os.getenv("SCRAPER_DETAIL_RATE", "0"))  # requests/sec ceiling; 0 = off
+SCRAPER_DETAIL_BURST          = int(os.getenv("SCRAPER_DETAIL_BURST", "0"))   # bucket size; 0 = one second's worth
 
 _t0_global = time.time()
 _last_beat = {"count": 0, "t": _t0_global}
@@ -90,26 +112,50 @@ DETAIL_COLS = [
     "List of active ingredient","Dosage form","Route(s) of administration",
 ]
 COLUMNS = DETAIL_COLS[:]
+# Columns with a handful of distinct values repeated across ~50k rows; interned
+# so every row shares one str object per value
+LOWCARD_COLS = (
+    "Status","Class","PM See footnote1","Schedule","Company",
+    "City","state","Country","Biosimilar Biologic Drug",
+    "Dosage form","Route(s) of administration",
+)
+_EMPTY_DETAIL = {k: "" for k in DETAIL_COLS}  # copy(), never mutate
+# Set (True) on rows whose detail page was skipped as already synced (see
+# iter_enriched_rows); not a DETAIL_COLS column, so writers and the sync mapper drop it
+DETAIL_SKIPPED_KEY = "_detail_skipped"
 
 # ============================================================================
 # UTILS
 # ============================================================================
-SPACES_RX = re.compile(r"[ \t\r\f\v]+")
-DATE_RX   = re.compile(r"\b(19|20)\d{2}-\d{2}-\d{2}\b")
+SPACES_RX    = re.compile(r"[\xa0\u200b \t\r\f\v]+")  # nbsp/zero-width folded in; newlines kept
+DATE_RX      = re.compile(r"\b(19|20)\d{2}-\d{2}-\d{2}\b")
+AI_LABEL_RX  = re.compile(r"active\s+ingredient|ingrédient\s+actif", re.I)
+AI_HEADER_NAMES = frozenset({"name", "active ingredient", "ingrédient actif"})  # header cells, casefolded
+TWO_SPACE_RX = re.compile(r"^(.*?)\s{2,}(.*)$")
+NON_DIGIT_RX = re.compile(r"\D+")
+DT_SRC_RX    = re.compile(r'"sAjaxSource"\s*:\s*"([^"]+)"')  # data-wb-tables config
+DT_LEN_RX    = re.compile(r'"iDisplayLength"\s*:\s*(\d+)')
+TOTAL_RX     = re.compile(r"(?:of|sur)\s+([0-9][0-9\s,\.]*)\s+(?:entries|entrées)", re.I)
+TAG_RX       = re.compile(r"<[^>]+>")
+WS_RX        = re.compile(r"\s+")
 
 def norm(x: str | None) -> str:
-    if not x:
-        return ""
-    x = x.replace("\xa0", " ").replace("\u200b", " ")
-    return SPACES_RX.sub(" ", x).strip()
+    return SPACES_RX.sub(" ", x).strip() if x else ""
 
 def _canon_din(d: str) -> str:
-    return "".join(ch for ch in (d or "") if ch.isdigit())
+    return NON_DIGIT_RX.sub("", d or "")
 
 def _canon_din_display(v: str) -> str:
-    s = "".join(ch for ch in str(v or "") if ch.isdigit())
+    s = NON_DIGIT_RX.sub("", str(v or ""))
     return s or (v or "")
 
+def _intern_lowcard(row: dict) -> dict:
+    for k in LOWCARD_COLS:
+        v = row.get(k)
+        if v and type(v) is str:
+            row[k] = sys.intern(v)
+    return row
+
 def _heartbeat(cum_rows: int, cap: int | None):
     if LOG_EVERY_ADDED <= 0:
         return
@@ -155,19 +201,164 @@ def _write_checkpoint_csv(rows: List[Dict], cols: List[str], phase: str, count:
     path = os.path.join(SCRAPER_CHECKPOINT_DIR, fn)
 
     if cols:
-        df = pd.DataFrame(rows, columns=cols)
+        ordered = list(cols)
     else:
         # union of keys (fallback)
         all_keys = set()
         for r in rows:
             all_keys.update(r.keys())
         ordered = [c for c in DETAIL_COLS if c in all_keys] + [k for k in sorted(all_keys) if k not in DETAIL_COLS]
-        df = pd.DataFrame(rows, columns=ordered)
 
-    df.to_csv(path, index=False, encoding="utf-8-sig")
+    # rows are already dicts: stream them through the C csv writer instead of
+    # building a DataFrame (missing keys → "", extra keys dropped, as before)
+    with open(path + ".part", "w", encoding="utf-8-sig", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=ordered, restval="", extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(path + ".part", path)
     dbg(f"[CKPT] wrote {phase} CSV → {path}")
     return path
 
+class _CheckpointSeries:
+    """
+    The checkpoints of one phase of one run. For jsonl.gz, each checkpoint
+    appends only the rows added since the previous one as a new gzip member
+    (readers see one concatenated stream) and renames the file to the new row
+    count, so total write work is O(N) instead of re-serializing the whole
+    prefix every time. CSV checkpoints are still full snapshots.
+
+    A caller that already keeps every row (the list phase) passes its list to
+    take(); a streaming caller (enrichment) add()s each row instead, and the
+    series holds only the rows since the last checkpoint (all rows for CSV).
+    """
+    def __init__(self, phase: str, cols: List[str]):
+        self.phase = phase
+        self.cols = cols
+        self.incremental = SCRAPER_CHECKPOINT_FORMAT != "csv"
+        self.enabled = SCRAPER_CHECKPOINT_EVERY_ROWS > 0
+        self.queued = 0            # rows handed to the writer (caller thread)
+        self.buf: List[Dict] = []  # add()ed rows not yet handed over (all of them for CSV)
+        self.unwritten: List[Dict] = []  # rows of a failed append, retried first (writer thread)
+        self.path: str | None = None
+        self.ts = time.strftime("%Y%m%d_%H%M%S")
+    def add(self, row: Dict) -> None:
+        if self.enabled:
+            self.buf.append(row)
+    def take(self, rows: List[Dict] | None = None) -> Tuple[List[Dict], int]:
+        """Snapshot what the next checkpoint needs (the new rows, or all of them) and the row count."""
+        if rows is None:
+            if not self.incremental:
+                self.queued = len(self.buf)
+                return list(self.buf), self.queued
+            chunk, self.buf = self.buf, []
+            self.queued += len(chunk)
+            return chunk, self.queued
+        chunk = rows[self.queued:] if self.incremental else list(rows)
+        self.queued = len(rows)
+        return chunk, self.queued
+    def write(self, rows: List[Dict], count: int) -> str:
+        if not self.incremental:
+            return _write_checkpoint_csv(rows, self.cols, phase=self.phase, count=count)
+        fn = f"{SCRAPER_CHECKPOINT_PREFIX}_{self.phase}_{count:06d}_{self.ts}.jsonl.gz"
+        path = os.path.join(SCRAPER_CHECKPOINT_DIR, fn)
+        rows = self.unwritten + rows
+        cols = self.cols
+        # one gzip member per checkpoint, built in memory and appended with a
+        # single write; on failure the file is cut back to its previous end, so
+        # it never holds a half member or a name claiming rows it lacks
+        src = self.path or path
+        try:
+            _ensure_dir(SCRAPER_CHECKPOINT_DIR)
+            member = gzip.compress(b"".join(
+                orjson.dumps({c: r.get(c, "") for c in cols} if cols else r) + b"\n" for r in rows
+            ), compresslevel=6)
+            with open(src, "ab") as fh:
+                end = fh.tell()
+                try:
+                    fh.write(member)
+                    fh.flush()
+                except BaseException:
+                    fh.truncate(end)
+                    raise
+        except BaseException:
+            self.unwritten = rows
+            raise
+        self.unwritten = []
+        if src != path:
+            os.replace(src, path)
+        self.path = path
+        dbg(f"[CKPT] appended {len(rows)} {self.phase} rows → {path}")
+        return path
+
+def latest_checkpoint(
+    checkpoint_dir: str | None = None,
+    prefix: str | None = None,
+    phase: str | None = None,
+) -> str | None:
+    """
+    Newest checkpoint file (either format) in 'checkpoint_dir', or None.
+    'phase' ("list" or "enriched") restricts the search to that phase; list
+    checkpoints hold list-page fields only and must not be synced as products.
+    """
+    d = checkpoint_dir or SCRAPER_CHECKPOINT_DIR
+    p = f"{prefix or SCRAPER_CHECKPOINT_PREFIX}_{phase}" if phase else (prefix or SCRAPER_CHECKPOINT_PREFIX)
+    files = glob.glob(os.path.join(d, f"{p}_*.jsonl.gz")) + glob.glob(os.path.join(d, f"{p}_*.csv"))
+    return max(files, key=os.path.getmtime) if files else None
+
+def iter_checkpoint_rows(path: str) -> Iterator[Dict]:
+    """Rows of a checkpoint (either format, see _CheckpointSeries), one at a time."""
+    if path.endswith(".jsonl.gz"):
+        with gzip.open(path, "rb") as fh:
+            try:
+                for line in fh:
+                    if line.strip():
+                        yield orjson.loads(line)
+            except EOFError:
+                # killed mid-append: the complete members before it are intact
+                dbg(f"[CKPT] {path}: truncated last chunk ignored")
+        return
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:  # CSVs carry a BOM
+        yield from csv.DictReader(fh)
+
+def load_checkpoint_rows(path: str) -> List[Dict]:
+    """All rows of a checkpoint as a list (see iter_checkpoint_rows)."""
+    return list(iter_checkpoint_rows(path))
+
+class _CheckpointWriter:
+    """
+    One background thread that drains a small queue of checkpoint jobs, so the
+    scrape loop keeps fetching while the checkpoint is written. submit() snapshots
+    the rows the series still needs; flush() blocks until everything queued is on disk.
+    """
+    def __init__(self, depth: int = 2):
+        self.q: Queue = Queue(maxsize=max(1, depth))
+        self.t = threading.Thread(target=self._loop, name="ckpt-writer", daemon=True)
+        self.t.start()
+    def _loop(self) -> None:
+        while True:
+            series, rows, count = self.q.get()
+            try:
+                series.write(rows, count)
+            except Exception as e:
+                # not dbg(): the timeout recovery in run_monthly_sync reads these files
+                print(f"[CKPT WARN] {series.phase} checkpoint at {count} rows "
+                      f"({series.path or SCRAPER_CHECKPOINT_DIR}) failed, retried at the next one: {e!r}",
+                      file=sys.stderr)
+            finally:
+                self.q.task_done()
+    def submit(self, series: "_CheckpointSeries", rows: List[Dict] | None = None) -> None:
+        self.q.put((series, *series.take(rows)))
+    def flush(self) -> None:
+        self.q.join()
+
+_ckpt_writer_obj: _CheckpointWriter | None = None
+
+def _checkpoint_writer() -> _CheckpointWriter:
+    global _ckpt_writer_obj
+    if _ckpt_writer_obj is None:
+        _ckpt_writer_obj = _CheckpointWriter()
+    return _ckpt_writer_obj
+
 class _CheckpointGate:
     """Fires every SCRAPER_CHECKPOINT_EVERY_ROWS rows (if > 0)."""
     def __init__(self, every: int):
@@ -181,6 +372,82 @@ class _CheckpointGate:
             return True
         return False
 
+class _DetailCache:
+    """sqlite-backed {DIN URL: compressed HTML} so a resumed run skips pages it already fetched."""
+    def __init__(self, path: str, ttl: int):
+        _ensure_dir(os.path.dirname(path) or ".")
+        self.ttl  = max(0, int(ttl))
+        self.lock = threading.Lock()
+        self.db   = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, fetched REAL, body BLOB)")
+    def get(self, url: str) -> str | None:
+        with self.lock:
+            hit = self.db.execute("SELECT fetched, body FROM pages WHERE url = ?", (url,)).fetchone()
+        if not hit:
+            return None
+        if self.ttl and time.time() - hit[0] > self.ttl:
+            return None
+        return zlib.decompress(hit[1]).decode("utf-8")
+    def put(self, url: str, text: str) -> None:
+        blob = zlib.compress(text.encode("utf-8"), 1)  # level 1: cheap on the fetch path, HTML still shrinks several-fold
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (url, time.time(), blob))
+            self.db.commit()
+
+_detail_cache_obj: _DetailCache | None = None
+
+def _detail_cache() -> _DetailCache | None:
+    global _detail_cache_obj
+    if not SCRAPER_DETAIL_CACHE:
+        return None
+    if _detail_cache_obj is None:
+        _detail_cache_obj = _DetailCache(SCRAPER_DETAIL_CACHE, SCRAPER_DETAIL_CACHE_TTL)
+        dbg(f"[CACHE] detail pages → {SCRAPER_DETAIL_CACHE} (ttl={SCRAPER_DETAIL_CACHE_TTL}s)")
+    return _detail_cache_obj
+
+class _TokenBucket:
+    """
+    Client-side admission so detail workers stay under the server's limit
+    instead of eating 429 back-offs. AIMD: halve the rate on a 429, creep
+    back toward the ceiling after a run of clean responses.
+    """
+    def __init__(self, rate: float, capacity: int = 0):
+        self.max_rate  = float(rate)
+        self.min_rate  = self.max_rate / 16
+        self.rate      = self.max_rate
+        self.capacity  = float(capacity or max(1, round(rate)))
+        self.tokens    = self.capacity
+        self.stamp     = time.monotonic()
+        self.ok_streak = 0
+        self.lock      = threading.Lock()
+    def consume(self, n: float = 1.0) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+    def observe(self, r: requests.Response) -> None:
+        # urllib3 retries 429s inside the adapter; those show up only in the retry history
+        history = getattr(getattr(r.raw, "retries", None), "history", None) or ()
+        throttled = r.status_code == 429 or any(h.status == 429 for h in history)
+        with self.lock:
+            if throttled:
+                self.rate, self.ok_streak = max(self.min_rate, self.rate / 2), 0
+                dbg(f"[RATE] 429 → {self.rate:.2f} req/s")
+            elif self.rate < self.max_rate:
+                self.ok_streak += 1
+                if self.ok_streak >= 50:
+                    self.rate, self.ok_streak = min(self.max_rate, self.rate + self.max_rate / 10), 0
+
+_detail_bucket = _TokenBucket(SCRAPER_DETAIL_RATE, SCRAPER_DETAIL_BURST) if SCRAPER_DETAIL_RATE > 0 else None
+
 # ============================================================================
 # HTTP / SESSION
 # ============================================================================
@@ -189,6 +456,7 @@ def make_session() -> requests.Session:
     s.headers.update({
         "User-Agent": "Mozilla/5.0 (compatible; dpd-scraper/1.6)",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Encoding": "gzip, deflate",
         "Referer": FORM_URL,
         "Connection": "keep-alive",
     })
@@ -303,32 +571,46 @@ def submit_search(sess: requests.Session, basic_html: bool = False) -> tuple[str
 # ============================================================================
 # LIST PAGE PARSER (HTML)
 # ============================================================================
+LIST_TBODY_XP = XPath("(//table[@id='results']//tbody)[1]")
+LIST_TR_XP    = XPath(".//tr")
+LIST_TD_XP    = XPath(".//td")
+LIST_HREF_XP  = XPath("(.//a[@href])[1]")
+
+def _lxml_doc(text: str):
+    # lxml refuses whitespace/comment-only input; bs4 just returned an empty soup
+    try:
+        return lxml_html.fromstring(text or "<html/>")
+    except ParserError:
+        return lxml_html.fromstring("<html/>")
+
+def _cell_text(el) -> str:
+    # same as bs4 get_text(strip=True): strip each text node, join with no separator
+    return "".join(t.strip() for t in el.itertext())
+
 def parse_list_page_rows(html: str) -> list[dict]:
-    soup = BeautifulSoup(html or "", "html.parser")
-    table = soup.find("table", id="results")
-    if not table: return []
-    tbody = table.find("tbody")
+    tbody = LIST_TBODY_XP(_lxml_doc(html))
     if not tbody: return []
 
     rows_out: list[dict] = []
-    for tr in tbody.find_all("tr"):
-        tds = tr.find_all("td")
+    for tr in LIST_TR_XP(tbody[0]):
+        tds = LIST_TD_XP(tr)
         if len(tds) < 10:
             continue
-        status    = tds[0].get_text(strip=True)
+        status    = _cell_text(tds[0])
         din_cell  = tds[1]
-        company   = tds[2].get_text(strip=True)
-        product   = tds[3].get_text(strip=True)
-        drugclass = tds[4].get_text(strip=True)
-        pm        = tds[5].get_text(strip=True)
-        schedule  = tds[6].get_text(strip=True)
-        ai_num    = tds[7].get_text(strip=True)
-        ai_name   = tds[8].get_text(strip=True)
-        strength  = tds[9].get_text(strip=True)
-
-        a_tag    = din_cell.find("a", href=True)
-        din_text = (a_tag.get_text(strip=True) if a_tag else din_cell.get_text(strip=True))
-        din_href = (a_tag["href"] if a_tag else "")
+        company   = _cell_text(tds[2])
+        product   = _cell_text(tds[3])
+        drugclass = _cell_text(tds[4])
+        pm        = _cell_text(tds[5])
+        schedule  = _cell_text(tds[6])
+        ai_num    = _cell_text(tds[7])
+        ai_name   = _cell_text(tds[8])
+        strength  = _cell_text(tds[9])
+
+        a_tag    = LIST_HREF_XP(din_cell)
+        a_tag    = a_tag[0] if a_tag else None
+        din_text = _cell_text(a_tag if a_tag is not None else din_cell)
+        din_href = (a_tag.get("href") if a_tag is not None else "")
         din_url  = urljoin(BASE, din_href) if din_href else ""
 
         row = {
@@ -344,7 +626,7 @@ def parse_list_page_rows(html: str) -> list[dict]:
             "A.I. name See footnote3": ai_name,
             "Strength": strength,
         }
-        rows_out.append(row)
+        rows_out.append(_intern_lowcard(row))
     return rows_out
 
 def _detect_table_paging(html: str) -> tuple[str, int]:
@@ -352,8 +634,8 @@ def _detect_table_paging(html: str) -> tuple[str, int]:
         soup = BeautifulSoup(html, "html.parser")
         tbl = soup.find("table", id="results")
         cfg = (tbl.get("data-wb-tables") or "") if tbl else ""
-        src = re.search(r'"sAjaxSource"\s*:\s*"([^"]+)"', cfg)
-        per = re.search(r'"iDisplayLength"\s*:\s*(\d+)', cfg)
+        src = DT_SRC_RX.search(cfg)
+        per = DT_LEN_RX.search(cfg)
         api = urljoin(BASE, src.group(1)) if src else GET_PAGE_API
         n   = int(per.group(1)) if per else 25
         return api, n
@@ -361,7 +643,7 @@ def _detect_table_paging(html: str) -> tuple[str, int]:
         return GET_PAGE_API, 25
 
 def _extract_total_entries(html: str) -> int | None:
-    m = re.search(r"(?:of|sur)\s+([0-9][0-9\s,\.]*)\s+(?:entries|entrées)", html, flags=re.I)
+    m = TOTAL_RX.search(html)
     if not m: return None
     raw = m.group(1).replace("\u202f"," ").replace("\xa0"," ")
     raw = raw.replace(" ", "").replace(",", "").replace(".", "")
@@ -373,29 +655,39 @@ def _extract_total_entries(html: str) -> int | None:
 # ============================================================================
 # DT JSON → ROWS
 # ============================================================================
+@lru_cache(maxsize=65536)
+def _dt_cell(s: str) -> tuple[str, str]:
+    """
+    DataTables cell markup → (text, first href). Cached: status, company,
+    class and schedule cells repeat across thousands of rows.
+    """
+    if "<" not in s and "&" not in s:
+        # plain text (most cells): no tags or entities for a parser to handle
+        return s.strip(), ""
+    try:
+        soup = BeautifulSoup(s, "html.parser")
+        a = soup.find("a", href=True)
+        href = a["href"] if a else ""
+        text = soup.get_text(" ", strip=True)
+        return text, href
+    except Exception:
+        text = TAG_RX.sub("", s)
+        text = WS_RX.sub(" ", text).strip()
+        return text, ""
+
 def _dt_aa_to_listrows(aa: list) -> list[dict]:
     rows: list[dict] = []
     if not aa:
         return rows
 
     def _cell_text_and_href(cell_val) -> tuple[str, str]:
-        s = "" if cell_val is None else str(cell_val)
-        try:
-            soup = BeautifulSoup(s, "html.parser")
-            a = soup.find("a", href=True)
-            href = a["href"] if a else ""
-            text = soup.get_text(" ", strip=True)
-            return text, href
-        except Exception:
-            text = re.sub(r"<[^>]+>", "", s)
-            text = re.sub(r"\s+", " ", text).strip()
-            return text, ""
+        return _dt_cell("" if cell_val is None else str(cell_val))
 
     def _make_row(cells: list[str]) -> dict:
         def g(i): return cells[i] if i < len(cells) else ""
         din_txt, din_href = _cell_text_and_href(g(1))
         din_url = urljoin(BASE, din_href) if din_href else ""
-        return {
+        return _intern_lowcard({
             "Status": _cell_text_and_href(g(0))[0],
             "DIN URL": din_url,
             "DIN": _canon_din_display(din_txt),
@@ -407,7 +699,7 @@ def _dt_aa_to_listrows(aa: list) -> list[dict]:
             "# See footnote2": _cell_text_and_href(g(7))[0],
             "A.I. name See footnote3": _cell_text_and_href(g(8))[0],
             "Strength": _cell_text_and_href(g(9))[0],
-        }
+        })
 
     if isinstance(aa[0], dict):
         DT_KEYS = ["status","din","company","brand","drugClass","pm","schedule","aiNum","majorAI","AIStrength"]
@@ -425,6 +717,25 @@ def _dt_aa_to_listrows(aa: list) -> list[dict]:
 # ============================================================================
 # ACTIVE INGREDIENTS (robust)
 # ============================================================================
+def _br_split_text(el) -> list[str]:
+    """Text of a bs4 element split on <br> and newlines, walking the existing tree."""
+    parts: list[str] = []
+    buf: list[str] = []
+    for node in el.descendants:
+        if isinstance(node, NavigableString):
+            if isinstance(node, PreformattedString):  # comments, CDATA, ...
+                continue
+            first, *rest = node.split("\n")
+            buf.append(first)
+            for chunk in rest:
+                parts.append("".join(buf))
+                buf = [chunk]
+        elif node.name == "br":
+            parts.append("".join(buf))
+            buf = []
+    parts.append("".join(buf))
+    return parts
+
 def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
     """
     Return a list like ["SODIUM CHLORIDE : 0.9 %", ...] from any of the
@@ -438,14 +749,13 @@ def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
         strength = norm(strength)
         if not name:
             return
-        if name.lower() in ("name", "active ingredient", "ingrédient actif"):
+        if name.casefold() in AI_HEADER_NAMES:
             return
         lines.append(f"{name} : {strength}" if strength else name)
 
     # 1) Table with <caption> mentioning Active ingredient
     for cap in soup.find_all("caption"):
-        cap_txt = norm(cap.get_text(" "))
-        if "active ingredient" in cap_txt.lower() or "ingrédient actif" in cap_txt.lower():
+        if AI_LABEL_RX.search(norm(cap.get_text(" "))):
             table = cap.find_parent("table")
             if table:
                 for tr in table.find_all("tr"):
@@ -457,8 +767,7 @@ def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
 
     # 2) Any table where header contains it
     for table in soup.find_all("table"):
-        head_txt = norm((table.find("thead") or table).get_text(" "))
-        if "active ingredient" in head_txt.lower() or "ingrédient actif" in head_txt.lower():
+        if AI_LABEL_RX.search(norm((table.find("thead") or table).get_text(" "))):
             for tr in table.find_all("tr"):
                 tds = tr.find_all(["td", "th"])
                 if len(tds) >= 2:
@@ -468,14 +777,12 @@ def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
 
     # 3) Definition list pattern <dt>/<dd> or <th>/<td>
     for dt_tag in soup.find_all(["dt", "th"]):
-        lab = norm(dt_tag.get_text(" "))
-        if "active ingredient" in lab.lower() or "ingrédient actif" in lab.lower():
+        if AI_LABEL_RX.search(norm(dt_tag.get_text(" "))):
             dd = dt_tag.find_next("dd") or dt_tag.find_next("td")
             if dd:
                 parts = [norm(li.get_text(" ")) for li in dd.find_all("li")]
                 if not parts:
-                    raw = dd.decode_contents()
-                    parts = [norm(p) for p in re.split(r"<br\s*/?>|\n", raw, flags=re.I)]
+                    parts = [norm(p) for p in _br_split_text(dd)]
                 for p in parts:
                     if not p:
                         continue
@@ -483,7 +790,7 @@ def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
                         nm, st = p.split(" : ", 1)
                         add(nm, st)
                     else:
-                        m = re.match(r"^(.*?)[\s]{2,}(.*)$", p)
+                        m = TWO_SPACE_RX.match(p)
                         if m:
                             add(m.group(1), m.group(2))
                         else:
@@ -494,7 +801,7 @@ def _extract_ai_lines(soup: BeautifulSoup) -> list[str]:
     # 4) Paragraph block that mentions it and contains <br>-separated items
     for p in soup.find_all("p"):
         text = p.get_text("\n", strip=True)
-        if "active ingredient" in text.lower() or "ingrédient actif" in text.lower():
+        if AI_LABEL_RX.search(text):
             parts = [norm(x) for x in text.split("\n") if norm(x)]
             for x in parts:
                 if " : " in x:
@@ -512,101 +819,142 @@ def parse_active_ingredients_multiline(soup: BeautifulSoup) -> str:
     return "\n".join(lines)
 
 # ============================================================================
-# DETAIL PAGE (html.parser only)
+# DETAIL PAGE (lxml label/value rows; html.parser only for the AI fallback)
 # ============================================================================
+def _xp_class(tag: str, cls: str) -> str:
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+
+DETAIL_ROW_XP   = XPath(f"//{_xp_class('div', 'row')}")
+DETAIL_LEFT_XP  = XPath(f"(.//{_xp_class('p', 'col-sm-4')}//strong)[1]")
+DETAIL_RIGHT_XP = XPath(f"(.//{_xp_class('p', 'col-sm-8')})[1]")
+DETAIL_SPAN_XP  = XPath(".//span")
+DETAIL_HREF_XP  = XPath("(.//a[@href])[1]")
+
+def _detail_rows(tree) -> list[tuple[str, Any]]:
+    """One pass over div.row → [(lowercased label, right <p> or None), ...] in page order."""
+    rows = []
+    for row in DETAIL_ROW_XP(tree):
+        left = DETAIL_LEFT_XP(row)
+        if not left:
+            continue
+        label = " ".join(t.strip() for t in left[0].itertext() if t.strip()).lower()
+        right = DETAIL_RIGHT_XP(row)
+        rows.append((label, right[0] if right else None))
+    return rows
+
+def fetch_detail_html(sess: requests.Session, din_url: str) -> str:
+    """I/O half of a detail lookup: cache hit or GET (with retries) → raw HTML."""
+    cache = _detail_cache()
+    text = cache.get(din_url) if cache else None
+    if text is None:
+        def _get():
+            if _detail_bucket:
+                _detail_bucket.consume()
+            resp = sess.get(din_url, timeout=TIMEOUT)
+            if _detail_bucket:
+                _detail_bucket.observe(resp)
+            return resp
+        r = _with_retries(_get)
+        text = r.text or ""
+        if cache and text:
+            cache.put(din_url, text)
+    return text
+
+# detail column → lowercase substring of its row label, in page order
+DETAIL_LABELS: Tuple[Tuple[str, str], ...] = (
+    ("Status", "status"),
+    ("Company", "company"),
+    ("Product", "product"),
+    ("Class", "class"),
+    ("Schedule", "schedule"),
+    ("Current status date", "current status date"),
+    ("Original market date", "original market date"),
+    ("Dosage form", "dosage form"),
+    ("Route(s) of administration", "route"),
+    ("Number of active ingredient(s)", "number of active ingredient"),
+    ("American Hospital Formulary Service (AHFS)", "american hospital formulary service"),
+    ("Anatomical Therapeutic Chemical (ATC)", "anatomical therapeutic chemical"),
+    ("Active ingredient group (AIG) number", "active ingredient group"),
+)
+
+def parse_detail_html(text: str, din_url: str = "") -> Dict[str, str]:
+    """
+    CPU half of a detail lookup: raw HTML → DETAIL_COLS dict. Module-level and
+    pure so it can run in a worker process (SCRAPER_PARSE_PROCS > 0).
+    """
+    out = _EMPTY_DETAIL.copy()
+    rows = _detail_rows(_lxml_doc(text))
+
+    def gr(lab: str) -> str:
+        # 'lab' is already lowercase (left labels are lowercased in _detail_rows)
+        for left, right in rows:
+            if right is not None and lab in left:
+                return norm(" ".join(right.itertext()))
+        return ""
+
+    # core fields
+    for col, lab in DETAIL_LABELS:
+        out[col] = gr(lab)
+
+    # address block
+    comp_right = next((right for left, right in rows if "company" in left), None)
+    if comp_right is not None:
+        spans = [norm(" ".join(s.itertext())) for s in DETAIL_SPAN_XP(comp_right)]
+        if len(spans) >= 1: out["Address"] = spans[0]
+        if len(spans) >= 2: out["City"]    = spans[1]
+        if len(spans) >= 3: out["state"]   = spans[2]
+        if len(spans) >= 4: out["Country"] = spans[3]
+        if len(spans) >= 5: out["Zipcode"] = spans[4]
+
+    # labelling (url + date)
+    lab_url, lab_date = "", ""
+    for left, right in rows:
+        if right is None:
+            continue
+        if any(key in left for key in ("product monograph/veterinary labelling","product monograph","labelling")):
+            m = DATE_RX.search(" ".join(right.itertext()))
+            if m: lab_date = m.group(0)
+            a = DETAIL_HREF_XP(right)
+            if a and a[0].get("href"):
+                href = a[0].get("href")
+                lab_url = href if href.startswith("http") else urljoin(BASE, href)
+            break
+    out["Labelling"] = lab_url
+    out["Product Monograph/Veterinary Date"] = lab_date
+
+    # active ingredients (robust)
+    ai_lines = _extract_ai_lines(BeautifulSoup(text, "html.parser"))
+    out["List of active ingredient"] = "\n".join(ai_lines)
+
+    # If the AI list exists, make sure single AI fields are populated if blank
+    if ai_lines:
+        first = ai_lines[0]
+        if " : " in first:
+            nm, st = first.split(" : ", 1)
+            if not out.get("A.I. name See footnote3"):
+                out["A.I. name See footnote3"] = nm.strip()
+            if not out.get("Strength"):
+                out["Strength"] = st.strip()
+
+    # biosimilar
+    bs = gr("biosimilar biologic drug")
+    out["Biosimilar Biologic Drug"] = "Yes" if bs.lower().startswith("yes") else ("No" if bs else "")
+
+    if out.get("List of active ingredient"):
+        dbg(f"[AI] {din_url} -> {len(out['List of active ingredient'].splitlines())} AI line(s)")
+
+    non_empty = sum(1 for v in out.values() if v)
+    dbg(f"[DETAIL OK] filled {non_empty}/{len(out)} from {din_url}")
+    return out
+
 def fetch_detail_fields(sess: requests.Session, din_url: str, sleep: float=0.0) -> Dict[str, str]:
-    out = {k: "" for k in DETAIL_COLS}
+    out = _EMPTY_DETAIL.copy()
     if not din_url:
         return out
     try:
-        r = _with_retries(lambda: sess.get(din_url, timeout=TIMEOUT))
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        def gr(label: str) -> str:
-            lab = label.lower()
-            for row in soup.select("div.row"):
-                left = row.select_one("p.col-sm-4 strong")
-                right = row.select_one("p.col-sm-8")
-                if not left or not right: continue
-                if lab in left.get_text(" ").lower():
-                    return norm(right.get_text(" ").replace("\xa0"," "))
-            return ""
-
-        # core fields
-        out["Status"] = gr("Status")
-        out["Company"] = gr("Company")
-        out["Product"] = gr("Product")
-        out["Class"] = gr("Class")
-        out["Schedule"] = gr("Schedule")
-        out["Current status date"] = gr("Current status date")
-        out["Original market date"] = gr("Original market date")
-        out["Dosage form"] = gr("Dosage form")
-        out["Route(s) of administration"] = gr("Route")
-        out["Number of active ingredient(s)"] = gr("Number of active ingredient")
-        out["American Hospital Formulary Service (AHFS)"] = gr("American Hospital Formulary Service")
-        out["Anatomical Therapeutic Chemical (ATC)"] = gr("Anatomical Therapeutic Chemical")
-        out["Active ingredient group (AIG) number"] = gr("Active ingredient group")
-
-        # address block
-        comp_row = None
-        for row in soup.select("div.row"):
-            left = row.select_one("p.col-sm-4 strong")
-            if left and "company" in left.get_text(" ").lower():
-                comp_row = row; break
-        if comp_row:
-            right = comp_row.select_one("p.col-sm-8")
-            spans = [norm(s.get_text(" ")) for s in (right.select("span") if right else [])]
-            if len(spans) >= 1: out["Address"] = spans[0]
-            if len(spans) >= 2: out["City"]    = spans[1]
-            if len(spans) >= 3: out["state"]   = spans[2]
-            if len(spans) >= 4: out["Country"] = spans[3]
-            if len(spans) >= 5: out["Zipcode"] = spans[4]
-
-        # labelling (url + date)
-        lab_url, lab_date = "", ""
-        for row in soup.select("div.row"):
-            left = row.select_one("p.col-sm-4 strong")
-            right = row.select_one("p.col-sm-8")
-            if not left or not right:
-                continue
-            label = left.get_text(" ", strip=True).lower()
-            if any(key in label for key in ("product monograph/veterinary labelling","product monograph","labelling")):
-                m = DATE_RX.search(right.get_text(" ", strip=True))
-                if m: lab_date = m.group(0)
-                a = right.find("a", href=True)
-                if a and a["href"]:
-                    href = a["href"]
-                    lab_url = href if href.startswith("http") else urljoin(BASE, href)
-                break
-        out["Labelling"] = lab_url
-        out["Product Monograph/Veterinary Date"] = lab_date
-
-        # active ingredients (robust)
-        ai_lines = _extract_ai_lines(soup)
-        out["List of active ingredient"] = "\n".join(ai_lines)
-
-        # If the AI list exists, make sure single AI fields are populated if blank
-        if ai_lines:
-            first = ai_lines[0]
-            if " : " in first:
-                nm, st = first.split(" : ", 1)
-                if not out.get("A.I. name See footnote3"):
-                    out["A.I. name See footnote3"] = nm.strip()
-                if not out.get("Strength"):
-                    out["Strength"] = st.strip()
-
-        # biosimilar
-        bs = gr("Biosimilar Biologic Drug")
-        out["Biosimilar Biologic Drug"] = "Yes" if bs.lower().startswith("yes") else ("No" if bs else "")
-
+        out = parse_detail_html(fetch_detail_html(sess, din_url), din_url)
         if sleep and sleep > 0:
             time.sleep(sleep)
-
-        if out.get("List of active ingredient"):
-            dbg(f"[AI] {din_url} -> {len(out['List of active ingredient'].splitlines())} AI line(s)")
-
-        non_empty = sum(1 for v in out.values() if v)
-        dbg(f"[DETAIL OK] filled {non_empty}/{len(out)} from {din_url}")
         return out
     except Exception as e:
         dbg(f"[DETAIL ERR] {din_url} :: {e!r}")
@@ -658,10 +1006,15 @@ def collect_all_list_rows(
     def _hit_cap() -> bool:
         return max_rows > 0 and len(rows_all) >= max_rows
 
+    # canonical DINs already in rows_all; kept in step with every append below
+    # rather than rebuilt from the whole list on each page
+    seen: set[str] = {_canon_din(r.get("DIN","")) for r in rows_all}
+
     # CSV checkpoint gate for LIST phase
     _list_ckpt = _CheckpointGate(SCRAPER_CHECKPOINT_EVERY_ROWS)
+    _list_series = _CheckpointSeries("list", DETAIL_COLS)
     if _list_ckpt.maybe(len(rows_all)):
-        _write_checkpoint_csv(rows_all, DETAIL_COLS, phase="list", count=len(rows_all))
+        _checkpoint_writer().submit(_list_series, rows_all)
 
     # helpers
     def _with_csrf(extra: dict) -> dict:
@@ -705,9 +1058,9 @@ def collect_all_list_rows(
         dbg(f"[DT GET] {page_api_url} start={start} len={per_page} filter={filter_key}:{value}")
         r = _with_retries(lambda: sess.get(page_api_url, params=params, timeout=TIMEOUT, headers=headers))
         try:
-            j = r.json()
-        except Exception:
-            j = json.loads(r.text)
+            j = orjson.loads(r.content)  # straight from bytes, no text decode
+        except orjson.JSONDecodeError:
+            j = r.json()  # BOM / non-UTF-8 body: let requests sniff the encoding
         aa = j.get("aaData") or j.get("data") or []
         rows = _dt_aa_to_listrows(aa)
         if rows:
@@ -765,7 +1118,6 @@ def collect_all_list_rows(
         if not rows1:
             return 0, False
         saw_any = True
-        seen = {_canon_din(r.get("DIN","")) for r in rows_all}
         added_this = 0
         for rr in rows1:
             din = _canon_din(rr.get("DIN",""))
@@ -792,7 +1144,6 @@ def collect_all_list_rows(
             else:
                 stall = 0
                 added_this = 0
-                seen = {_canon_din(r.get("DIN","")) for r in rows_all}
                 for rr in rows_p:
                     din = _canon_din(rr.get("DIN",""))
                     if din and din not in seen:
@@ -805,7 +1156,7 @@ def collect_all_list_rows(
 
             # checkpoint after each page
             if _list_ckpt.maybe(len(rows_all)):
-                _write_checkpoint_csv(rows_all, DETAIL_COLS, phase="list", count=len(rows_all))
+                _checkpoint_writer().submit(_list_series, rows_all)
 
             # honor a fixed cap only if set (>0). SWEEP_PAGE_LIMIT<=0 means "no fixed page cap"
             if SWEEP_PAGE_LIMIT > 0 and p >= SWEEP_PAGE_LIMIT:
@@ -839,61 +1190,132 @@ def collect_all_list_rows(
         return False
 
     dbg("Starting sharded sweeps (POST→DT JSON→HTML)…")
-    if SCRAPER_SWEEP_ORDER == "brand-first":
-        if _run_prefix_group("brandName", brand_prefixes): return rows_all[:max_rows] if _hit_cap() else rows_all
-        if _run_prefix_group("din", din_prefixes):         return rows_all[:max_rows] if _hit_cap() else rows_all
-    else:
-        if _run_prefix_group("din", din_prefixes):         return rows_all[:max_rows] if _hit_cap() else rows_all
-        if _run_prefix_group("brandName", brand_prefixes): return rows_all[:max_rows] if _hit_cap() else rows_all
-
+    groups = [("brandName", brand_prefixes), ("din", din_prefixes)]
+    if SCRAPER_SWEEP_ORDER != "brand-first":
+        groups.reverse()
+    for kind, values in groups:
+        if _run_prefix_group(kind, values):
+            break
+
+    _checkpoint_writer().flush()
     return rows_all if not _hit_cap() else rows_all[:max_rows]
 
 # ============================================================================
 # ENRICHMENT (detail never clobbers non-empty)
 # ============================================================================
-def enrich_rows_with_details(sess: requests.Session, rows_all: list[dict], sleep: float) -> list[dict]:
-    enriched: list[dict] = []
-    _enrich_ckpt = _CheckpointGate(SCRAPER_CHECKPOINT_EVERY_ROWS)
-
-    for i, r in enumerate(rows_all, 1):
-        base = {k: "" for k in DETAIL_COLS}
-        # copy list values
-        for k, v in (r or {}).items():
-            if v is not None:
-                base[k] = str(v)
-
-        din_url = (base.get("DIN URL") or "").strip()
-        if din_url:
-            try:
-                det = fetch_detail_fields(sess, din_url, sleep=0.0)
-            except Exception as e:
-                dbg(f"[DETAIL] {din_url} error: {e!r}")
-                det = {}
-            for k, v in (det or {}).items():
-                if v:  # only overwrite with non-empty
-                    base[k] = v
-
-        if not base.get("Biosimilar Biologic Drug"):
-            base["Biosimilar Biologic Drug"] = "No"
-
-        for col in DETAIL_COLS:
-            base[col] = "" if base.get(col) is None else str(base.get(col))
-
-        enriched.append(base)
+def enrich_rows_with_details(
+    sess: requests.Session,
+    rows_all: list[dict],
+    sleep: float,
+    workers: int = DEF_DETAIL_WORKERS,
+    parse_procs: int = DEF_PARSE_PROCS,
+) -> list[dict]:
+    return list(iter_enriched_rows(sess, rows_all, sleep, workers=workers, parse_procs=parse_procs))
 
-        if i % DEF_ENRICH_FLUSH_EVERY == 0:
-            filled = sum(1 for v in base.values() if v)
-            dbg(f"[ENRICH] {i}/{len(rows_all)} (last row filled {filled}/{len(base)})")
-        dbg_row("ENRICH", i, base)
+def iter_enriched_rows(
+    sess: requests.Session,
+    rows_all: list[dict],
+    sleep: float,
+    workers: int = DEF_DETAIL_WORKERS,
+    parse_procs: int = DEF_PARSE_PROCS,
+    skip_dins: Optional[Collection[str]] = None,
+) -> Iterator[dict]:
+    """
+    Detail pages are fetched on a thread pool ('workers'); parsing runs in that
+    thread, or on a process pool when 'parse_procs' > 0 so lxml/bs4 work is not
+    serialized by the GIL. Rows are yielded in input order as soon as they are
+    enriched, so a consumer can start syncing before the last page is fetched.
+    Rows whose DIN is in 'skip_dins' (already synced) are passed through with
+    list-page fields only and DETAIL_SKIPPED_KEY set; their detail page is
+    never fetched, no detail default is filled in, and they are left out of
+    the checkpoints, which hold fully enriched rows only.
+    """
+    _enrich_ckpt = _CheckpointGate(SCRAPER_CHECKPOINT_EVERY_ROWS)
+    _enrich_series = _CheckpointSeries("enriched", DETAIL_COLS)
+    parse_pool = (ProcessPoolExecutor(max_workers=parse_procs, mp_context=multiprocessing.get_context("spawn"))
+                  if parse_procs > 0 else None)
+
+    def _detail(r: dict) -> dict | None:
+        din_url = str((r or {}).get("DIN URL") or "").strip()
+        if not din_url:
+            return {}
+        if skip_dins and str(r.get("DIN") or "").strip() in skip_dins:
+            return None  # skipped, as opposed to {} for a failed fetch
+        try:
+            html = fetch_detail_html(sess, din_url)
+            if sleep and sleep > 0:
+                time.sleep(sleep)
+            if parse_pool:
+                return parse_pool.submit(parse_detail_html, html, din_url).result()
+            return parse_detail_html(html, din_url)
+        except Exception as e:
+            dbg(f"[DETAIL] {din_url} error: {e!r}")
+            return {}
+
+    dbg(f"[ENRICH] {len(rows_all)} rows | fetch workers={max(1, workers)} | parse procs={max(0, parse_procs)}"
+        f" | known DINs (no detail fetch)={len(skip_dins or ())}")
+    # bounded in-order window: at most 'window' rows in flight, results consumed
+    # in input order, so memory stays flat and rows never come back shuffled
+    window = max(1, workers) * 4
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="detail") as ex:
+            todo = iter(rows_all)
+            pending = deque((r, ex.submit(_detail, r)) for r in islice(todo, window))
+            i = kept = 0  # rows yielded / rows that go to the checkpoints
+            while pending:
+                r, fut = pending.popleft()
+                for nxt in islice(todo, 1):
+                    pending.append((nxt, ex.submit(_detail, nxt)))
+                i += 1
+                det = fut.result()
+                if det is None:
+                    base = _merge_detail(r, {}, skipped=True)
+                else:
+                    base = _merge_detail(r, det)
+                    kept += 1
+                    _enrich_series.add(base)  # jsonl: held only until the next checkpoint
+
+                if i % DEF_ENRICH_FLUSH_EVERY == 0:
+                    filled = sum(1 for v in base.values() if v)
+                    dbg(f"[ENRICH] {i}/{len(rows_all)} (last row filled {filled}/{len(base)})")
+                dbg_row("ENRICH", i, base)
+
+                # checkpoint enriched set: the trigger counts every row (skipped
+                # ones too, or a mostly-known run would never checkpoint), the
+                # write happens only when there are new enriched rows to add
+                if _enrich_ckpt.maybe(i) and kept > _enrich_series.queued:
+                    _checkpoint_writer().submit(_enrich_series)
+                yield base
+    finally:
+        if parse_pool:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+
+    _checkpoint_writer().flush()
+
+def _merge_detail(r: dict, det: dict, skipped: bool = False) -> dict:
+    """
+    List row + detail dict → full DETAIL_COLS row (detail never clobbers with empties).
+    'skipped' marks a row whose detail page was deliberately not fetched: it
+    gets DETAIL_SKIPPED_KEY and no detail defaults.
+    """
+    base = _EMPTY_DETAIL.copy()
+    # copy list values
+    for k, v in (r or {}).items():
+        if v is not None:
+            base[k] = str(v)
 
-        # checkpoint enriched set
-        if _enrich_ckpt.maybe(len(enriched)):
-            _write_checkpoint_csv(enriched, DETAIL_COLS, phase="enriched", count=len(enriched))
+    for k, v in (det or {}).items():
+        if v:  # only overwrite with non-empty
+            base[k] = v
 
-        if sleep and sleep > 0:
-            time.sleep(sleep)
+    if skipped:
+        base[DETAIL_SKIPPED_KEY] = True
+    elif not base.get("Biosimilar Biologic Drug"):
+        base["Biosimilar Biologic Drug"] = "No"
 
-    return enriched
+    # every value is already a str: list values are str()'d above, detail
+    # values come from the parser as text, and the template holds ""
+    return _intern_lowcard(base)
 
 # ============================================================================
 # EXCEL HELPER
@@ -919,16 +1341,102 @@ def save_styled_excel(df: pd.DataFrame, xlsx_path: str) -> None:
             est = max(12, min(est, 60))
             ws.column_dimensions[get_column_letter(i)].width = est
 
+def _row_picker(cols: List[str]):
+    """
+    r → cell values in 'cols' order. Enriched rows carry every column, so a C
+    itemgetter does the lookups; rows with gaps fall back to get(c, "").
+    """
+    pick = itemgetter(*cols)
+    def values(r: Dict):
+        try:
+            v = pick(r)
+        except KeyError:
+            return [r.get(c, "") for c in cols]
+        return v if len(cols) > 1 else (v,)
+    return values
+
+def save_streaming_excel(rows: Iterable[Dict], xlsx_path: str, cols: Optional[List[str]] = None) -> None:
+    """
+    Same sheet as save_styled_excel (bold wrapped header, frozen first row,
+    autofilter, wrapped cells) written row by row with xlsxwriter's
+    constant_memory mode, so a full scrape never sits in memory as a workbook.
+    Column widths come from the header alone since rows are not held.
+    xlsxwriter is optional; without it openpyxl's write-only mode streams the
+    rows instead (same layout, body cells unwrapped).
+    """
+    cols = list(cols or DETAIL_COLS)
+    try:
+        import xlsxwriter  # optional: pip install xlsxwriter
+    except ImportError:
+        dbg("[XLSX] xlsxwriter not installed; using openpyxl write-only mode")
+        _save_write_only_excel(rows, xlsx_path, cols)
+        return
+    wb = xlsxwriter.Workbook(xlsx_path, {"constant_memory": True, "strings_to_urls": False})
+    try:
+        ws = wb.add_worksheet("DPD")
+        head_fmt = wb.add_format({"bold": True, "valign": "top", "text_wrap": True})
+        cell_fmt = wb.add_format({"valign": "top", "text_wrap": True})
+        for i, col in enumerate(cols):
+            ws.set_column(i, i, max(12, min(len(col), 60)), cell_fmt)
+        ws.set_row(0, 36)
+        ws.freeze_panes(1, 0)
+        ws.write_row(0, 0, cols, head_fmt)
+        values = _row_picker(cols)
+        n = 0
+        for n, r in enumerate(rows, start=1):
+            ws.write_row(n, 0, values(r))
+        ws.autofilter(0, 0, n, len(cols) - 1)
+    finally:
+        wb.close()
+
+def _save_write_only_excel(rows: Iterable[Dict], xlsx_path: str, cols: List[str]) -> None:
+    """openpyxl fallback for save_streaming_excel: rows are appended and flushed, never kept as cells."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("DPD")
+    for i, col in enumerate(cols, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = max(12, min(len(col), 60))
+    ws.freeze_panes = "A2"
+    head_font, head_align = Font(bold=True), Alignment(vertical="top", wrap_text=True)
+    header = []
+    for col in cols:
+        cell = WriteOnlyCell(ws, value=col)
+        cell.font, cell.alignment = head_font, head_align
+        header.append(cell)
+    ws.row_dimensions[1].height = 36
+    ws.append(header)
+    values = _row_picker(cols)
+    n = 1
+    for r in rows:
+        ws.append(values(r))
+        n += 1
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(cols))}{n}"
+    wb.save(xlsx_path)
+
 # ============================================================================
 # ENTRYPOINT
 # ============================================================================
-def run_full_scrape(
+def iter_full_scrape(
     max_depth: int = DEF_MAX_DEPTH,
     target_min_rows: int = DEF_TARGET_MIN_ROWS,
     enrich_flush_every: int = DEF_ENRICH_FLUSH_EVERY,
     request_sleep: float = DEF_REQUEST_SLEEP,
     max_rows: int = DEF_MAX_ROWS,
-) -> Tuple[List[Dict], Dict]:
+    meta: Dict | None = None,
+    skip_dins: Optional[Collection[str]] = None,
+    detail_workers: int = DEF_DETAIL_WORKERS,
+) -> Iterator[Dict]:
+    """
+    Streaming form of run_full_scrape: yields enriched rows in list order.
+    The list phase still runs to completion first (sweeps dedupe across shards);
+    detail enrichment is streamed. If 'meta' is given it is filled in once the
+    generator is exhausted. DINs in 'skip_dins' are yielded without detail
+    enrichment (see iter_enriched_rows); 'detail_workers' threads fetch the
+    detail pages.
+    """
     t0 = time.time()
     sess = make_session()
 
@@ -950,30 +1458,59 @@ def run_full_scrape(
     # coverage right after list phase (so you can catch empties early)
     dbg("[LIST COVERAGE TOTAL]", _coverage_counts(list_rows))
 
-    enriched = enrich_rows_with_details(sess, list_rows, sleep=0.0)
+    n = 0
+    for row in iter_enriched_rows(sess, list_rows, sleep=0.0, workers=detail_workers, skip_dins=skip_dins):
+        n += 1
+        yield row
+
+    elapsed = round(time.time() - t0, 2)
+    if meta is not None:
+        meta.update({
+            "strategy": "shard-sweeps(POST→DT→HTML) + full-detail-enrichment(lxml)",
+            "elapsed_sec": elapsed,
+            "rows": n,
+            "request_sleep": request_sleep,
+            "max_depth": max_depth,
+            "target_min_rows": target_min_rows,
+            "max_rows": max_rows,
+            "post_action": post_url,
+            "columns_order": DETAIL_COLS,
+        })
+    dbg("Done. Rows:", n, "Elapsed(s):", elapsed)
+
+def run_full_scrape(
+    max_depth: int = DEF_MAX_DEPTH,
+    target_min_rows: int = DEF_TARGET_MIN_ROWS,
+    enrich_flush_every: int = DEF_ENRICH_FLUSH_EVERY,
+    request_sleep: float = DEF_REQUEST_SLEEP,
+    max_rows: int = DEF_MAX_ROWS,
+) -> Tuple[List[Dict], Dict]:
+    meta: Dict = {}
+    enriched = list(iter_full_scrape(
+        max_depth=max_depth,
+        target_min_rows=target_min_rows,
+        enrich_flush_every=enrich_flush_every,
+        request_sleep=request_sleep,
+        max_rows=max_rows,
+        meta=meta,
+    ))
 
     # coverage after enrichment
     dbg("[ENRICH COVERAGE TOTAL]", _coverage_counts(enriched))
-
-    elapsed = round(time.time() - t0, 2)
-    meta = {
-        "strategy": "shard-sweeps(POST→DT→HTML) + full-detail-enrichment(html.parser)",
-        "elapsed_sec": elapsed,
-        "rows": len(enriched),
-        "request_sleep": request_sleep,
-        "max_depth": max_depth,
-        "target_min_rows": target_min_rows,
-        "max_rows": max_rows,
-        "post_action": post_url,
-        "columns_order": DETAIL_COLS,
-    }
-    dbg("Done. Rows:", len(enriched), "Elapsed(s):", elapsed)
     return enriched, meta
 
 if __name__ == "__main__":
-    rows, meta = run_full_scrape(
+    cli_kwargs = dict(
         target_min_rows=int(os.getenv("CLI_TARGET_MIN_ROWS", "30")),
         max_rows=int(os.getenv("CLI_MAX_ROWS", "30")),
         request_sleep=float(os.getenv("CLI_REQUEST_SLEEP", "0.03")),
     )
-    print({"rows": len(rows), **meta})
+    xlsx_out = os.getenv("CLI_XLSX_PATH", "").strip()
+    if xlsx_out:
+        # rows go straight from enrichment into the workbook, never held as a list
+        meta: Dict = {}
+        save_streaming_excel(iter_full_scrape(meta=meta, **cli_kwargs), xlsx_out)
+        print({"xlsx": xlsx_out, **meta})
+    else:
+        rows, meta = run_full_scrape(**cli_kwargs)
+        print({"rows": len(rows), **meta})
@@ -10,16 +10,18 @@ Main orchestration script that:
 from __future__ import annotations
 
 import argparse
-import json
+import logging
 import os
+import re
 import signal
 import sys
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
 
-# Import functions from other scripts
-import sys
-from pathlib import Path
+import orjson
+import requests
 
 # Add scripts directory to path
 scripts_dir = Path(__file__).parent
@@ -35,243 +37,357 @@ class ScraperError(RuntimeError):
 
 # Import from supabase_sync
 from supabase_sync import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_INSERT_CONCURRENCY,
+    configure_logging,
+    connect_pg,
+    copy_batches,
     fetch_existing_row_uids,
     insert_batches,
-    create_table,
-    normalize_row,
+    make_session,
+)
+from dpd_scraper.dpd_scraper import (
+    DEF_DETAIL_WORKERS,
+    iter_checkpoint_rows,
+    iter_full_scrape,
+    latest_checkpoint,
+)
+
+log = logging.getLogger("dpd_sync")
+
+
+RULE = "=" * 80
+
+
+def log_banner(*lines: str) -> None:
+    """Log 'lines' between two rules as one record: one timestamp, one write."""
+    log.info("\n".join((RULE, *lines, RULE)))
+
+
+# nexara_all_source column layout. Only the HC block (and DIN/NPN) is populated
+# from DPD; the other KF and MAGI columns are never sent (see _COLUMNS).
+_HC_COLUMNS = (
+    "Status", "DIN URL", "DIN", "Company", "Product", "Class", "PM See footnote1",
+    "Schedule", "# See footnote2", "A.I. name See footnote3", "Strength",
+    "Current status date", "Original market date",
+    "Address", "City", "state", "Country", "Zipcode",
+    "Number of active ingredient(s)", "Biosimilar Biologic Drug",
+    "American Hospital Formulary Service (AHFS)", "Anatomical Therapeutic Chemical (ATC)",
+    "Active ingredient group (AIG) number", "Labelling", "Product Monograph/Veterinary Date",
+    "List of active ingredient", "Dosage form", "Route(s) of administration",
+)
+# Copied straight from the DPD product (DIN is set from the stripped value)
+_HC_SOURCE_KEYS = tuple(k for k in _HC_COLUMNS if k != "DIN")
+
+_KF_COLUMNS = (
+    "Qty Ordered", "Item", "UPC#", "DIN/NPN", "Pack Size", "Product Description",
+    "Volume Purchases", "Min/Mult", "Extended Dating", "GST", "Price", "Supplier",
+    "Narcotics", "picture", "Inventory status",
+)
+
+_MAGI_FIELDS = (
+    "magi__product_id", "magi__Pro. Name", "magi__STR", "magi__P.S.", "magi__D.F.",
+    "magi__MFG", "magi__ACQ.P.", "magi__ORG", "magi__Status", "magi__DIN / NPN number / Local Cod",
+    "magi__Lead Time", "magi__Brand / Trade Name", "magi__Manufacturer / Brand Manufacturer *",
+    "magi__Unit Of Measurement*", "magi__Active Ingredient(s)", "magi__User indications",
+    "magi__Storage Conditions", "magi__Generic name (Short)", "magi__Route of Administration",
+    "magi__Warning(s)", "magi__Shelf Life", "magi__product pictures", "magi__Canadian_dollar",
+    "magi__Offering_Price", "magi__Customer", "magi__Countries", "magi__Aq Price",
+    "magi__C FE price", "magi__Q price", "magi__Inv/SO price", "magi__Correct new c s p",
+    "magi__End Sellig Price", "magi__Status/Visibility", "magi__Supplier Name",
+    "magi__Buying Price (Bill)", "magi__Supplier Product Price", "magi__Registration Class 1",
+    "magi__Registration Class 2", "magi__Therapeutic Class 3 (MOA,Chem,)", "magi__Hospital Formulary Class 4:",
+    "magi__Market Class 5(Generic, Brand)", "magi__Active ing. Grp/Generic Drug Code",
+    "magi__Alterative(s)", "magi__Also Known As", "magi__Therapeutic Class",
+    "magi__Quantity On Hand(Current Stock)", "magi__Re-Order Point", "magi__Lot / Batch Number",
+    "magi__Quantity", "magi__Expiration Date", "magi__UPC / GTIN Code", "magi__UPC 10",
+    "magi__Harmonized System:", "magi__Dimenstions In Mm:", "magi__Weight (in gram):",
+    "magi__Case Size:", "magi__Manufacturer Address:", "magi__Manufacture City:",
+    "magi__Manufacture State:", "magi__Manufacture Country:", "magi__Original Market Date:",
+    "magi__Current Status Date:", "magi__M.A. Holder:", "magi__M.A. Holder Address:",
+    "magi__Internal System Code # :", "magi__Special Handling", "magi__Stamp with time",
+    "magi___pictures_json", "magi___customers_json", "magi___suppliers_json", "magi___timeline_json",
+    "magi__scraped_at",
 )
 
+# KF/MAGI columns a DPD row never fills. They are left out of every insert, REST
+# and COPY alike, so they always get the column default (never "" in some
+# batches and NULL in others).
+_UNSENT_COLUMNS = frozenset(c for c in (*_KF_COLUMNS, *_MAGI_FIELDS) if c != "DIN/NPN")
 
+# Fixed output schema of every mapped row, in insert order
+_COLUMNS: tuple[str, ...] = tuple(
+    c for c in ("match_bucket", "source", "row_uid", "din_match_key", *_HC_COLUMNS, *_KF_COLUMNS, *_MAGI_FIELDS)
+    if c not in _UNSENT_COLUMNS
+)
 
+# Every mapped row is a copy of this, so all rows share _COLUMNS' key order
+_ROW_TEMPLATE: Dict[str, str] = dict.fromkeys(_COLUMNS, "")
+_ROW_TEMPLATE["match_bucket"] = _ROW_TEMPLATE["source"] = "HC"
 
-def map_dpd_product_to_nexara_format(product: Dict[str, str]) -> Dict[str, Optional[str]]:
+
+def map_dpd_product_to_nexara_format(
+    product: Dict[str, str],
+    din: Optional[str] = None,
+) -> Dict[str, Optional[str]]:
     """
     Map DPD product record to nexara_all_source table format.
+    Pass 'din' when the caller has already extracted and stripped it.
     """
-    din = product.get("DIN", "").strip()
+    if din is None:
+        din = product.get("DIN", "").strip()
     if not din:
         # Skip records without DIN
         return {}
     
-    # Create row_uid in format: HC:{DIN}
-    row_uid = f"HC:{din}"
-    
-    # Map DPD product data to nexara_all_source columns
-    # Only HC columns will be populated, KF and MAGI columns will be empty
-    mapped = {
-        "match_bucket": "HC",
-        "source": "HC",
-        "row_uid": row_uid,
-        "din_match_key": din,
-        "Status": product.get("Status", ""),
-        "DIN URL": product.get("DIN URL", ""),
-        "DIN": din,
-        "Company": product.get("Company", ""),
-        "Product": product.get("Product", ""),
-        "Class": product.get("Class", ""),
-        "PM See footnote1": product.get("PM See footnote1", ""),
-        "Schedule": product.get("Schedule", ""),
-        "# See footnote2": product.get("# See footnote2", ""),
-        "A.I. name See footnote3": product.get("A.I. name See footnote3", ""),
-        "Strength": product.get("Strength", ""),
-        "Current status date": product.get("Current status date", ""),
-        "Original market date": product.get("Original market date", ""),
-        "Address": product.get("Address", ""),
-        "City": product.get("City", ""),
-        "state": product.get("state", ""),
-        "Country": product.get("Country", ""),
-        "Zipcode": product.get("Zipcode", ""),
-        "Number of active ingredient(s)": product.get("Number of active ingredient(s)", ""),
-        "Biosimilar Biologic Drug": product.get("Biosimilar Biologic Drug", ""),
-        "American Hospital Formulary Service (AHFS)": product.get("American Hospital Formulary Service (AHFS)", ""),
-        "Anatomical Therapeutic Chemical (ATC)": product.get("Anatomical Therapeutic Chemical (ATC)", ""),
-        "Active ingredient group (AIG) number": product.get("Active ingredient group (AIG) number", ""),
-        "Labelling": product.get("Labelling", ""),
-        "Product Monograph/Veterinary Date": product.get("Product Monograph/Veterinary Date", ""),
-        "List of active ingredient": product.get("List of active ingredient", ""),
-        "Dosage form": product.get("Dosage form", ""),
-        "Route(s) of administration": product.get("Route(s) of administration", ""),
-        "Qty Ordered": "",
-        "Item": "",
-        "UPC#": "",
-        "DIN/NPN": din,
-        "Pack Size": "",
-        "Product Description": "",
-        "Volume Purchases": "",
-        "Min/Mult": "",
-        "Extended Dating": "",
-        "GST": "",
-        "Price": "",
-        "Supplier": "",
-        "Narcotics": "",
-        "picture": "",
-        "Inventory status": "",
-    }
-    
-    # Add all magi__ fields as empty strings
-    magi_fields = [
-        "magi__product_id", "magi__Pro. Name", "magi__STR", "magi__P.S.", "magi__D.F.",
-        "magi__MFG", "magi__ACQ.P.", "magi__ORG", "magi__Status", "magi__DIN / NPN number / Local Cod",
-        "magi__Lead Time", "magi__Brand / Trade Name", "magi__Manufacturer / Brand Manufacturer *",
-        "magi__Unit Of Measurement*", "magi__Active Ingredient(s)", "magi__User indications",
-        "magi__Storage Conditions", "magi__Generic name (Short)", "magi__Route of Administration",
-        "magi__Warning(s)", "magi__Shelf Life", "magi__product pictures", "magi__Canadian_dollar",
-        "magi__Offering_Price", "magi__Customer", "magi__Countries", "magi__Aq Price",
-        "magi__C FE price", "magi__Q price", "magi__Inv/SO price", "magi__Correct new c s p",
-        "magi__End Sellig Price", "magi__Status/Visibility", "magi__Supplier Name",
-        "magi__Buying Price (Bill)", "magi__Supplier Product Price", "magi__Registration Class 1",
-        "magi__Registration Class 2", "magi__Therapeutic Class 3 (MOA,Chem,)", "magi__Hospital Formulary Class 4:",
-        "magi__Market Class 5(Generic, Brand)", "magi__Active ing. Grp/Generic Drug Code",
-        "magi__Alterative(s)", "magi__Also Known As", "magi__Therapeutic Class",
-        "magi__Quantity On Hand(Current Stock)", "magi__Re-Order Point", "magi__Lot / Batch Number",
-        "magi__Quantity", "magi__Expiration Date", "magi__UPC / GTIN Code", "magi__UPC 10",
-        "magi__Harmonized System:", "magi__Dimenstions In Mm:", "magi__Weight (in gram):",
-        "magi__Case Size:", "magi__Manufacturer Address:", "magi__Manufacture City:",
-        "magi__Manufacture State:", "magi__Manufacture Country:", "magi__Original Market Date:",
-        "magi__Current Status Date:", "magi__M.A. Holder:", "magi__M.A. Holder Address:",
-        "magi__Internal System Code # :", "magi__Special Handling", "magi__Stamp with time",
-        "magi___pictures_json", "magi___customers_json", "magi___suppliers_json", "magi___timeline_json",
-        "magi__scraped_at"
-    ]
-    
-    for field in magi_fields:
-        mapped[field] = ""
-    
-    return mapped
+    row = _ROW_TEMPLATE.copy()
+    # row_uid format: HC:{DIN}
+    row["row_uid"] = f"HC:{din}"
+    row["din_match_key"] = row["DIN"] = row["DIN/NPN"] = din
+    for key in _HC_SOURCE_KEYS:
+        value = product.get(key)
+        if value:
+            row[key] = value
+    return row
+
 
+# Re-fetch window when a sync state file is used: rows created up to this long
+# before the previous run started are fetched again (clock skew, late commits).
+SYNC_STATE_MARGIN = timedelta(days=7)
 
-def products_to_nexara_rows(
-    products: List[Dict[str, str]],
-    existing_row_uids: Set[str],
-) -> tuple[List[Dict[str, Optional[str]]], List[str]]:
+
+def load_sync_state(path: Optional[Path]) -> Optional[Dict[str, Any]]:
+    """Read {"last_sync_ts": ISO, "dins": [...]} written by save_sync_state."""
+    if not path or not path.exists():
+        return None
+    try:
+        state = orjson.loads(path.read_bytes())
+        datetime.fromisoformat(state["last_sync_ts"])
+        if not isinstance(state.get("dins"), list):
+            return None
+        return state
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        log.warning(f"WARNING: Ignoring unreadable sync state {path}: {exc}")
+        return None
+
+
+def save_sync_state(path: Path, dins: Iterable[str], sync_ts: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    # orjson encodes the whole DIN list in one C call instead of json.dump's
+    # chunked Python-level writes
+    tmp.write_bytes(orjson.dumps({"last_sync_ts": sync_ts, "dins": sorted(dins)}))
+    os.replace(tmp, path)
+
+
+def fetch_existing_dins(
+    supabase_url: str,
+    service_role_key: str,
+    table_name: str,
+    state_path: Optional[Path] = None,
+    session: Optional[requests.Session] = None,
+) -> frozenset[str]:
     """
-    Convert DPD product records to nexara_all_source format.
-    Only includes records that are not already in Supabase (by row_uid).
+    DINs of the HC rows already in Supabase. With a readable sync state, the
+    cached DINs are combined with rows created since the previous run (minus
+    SYNC_STATE_MARGIN); otherwise, or if that query fails, everything is fetched.
     """
-    new_products = []
-    for product in products:
-        din = product.get("DIN", "").strip()
-        if not din:
-            continue  # Skip products without DIN
-        row_uid = f"HC:{din}"
-        if row_uid not in existing_row_uids:
-            new_products.append(product)
+    state = load_sync_state(state_path)
+    cached_dins: List[str] = []
+    row_uids: Optional[set[str]] = None
+    if state:
+        since = (datetime.fromisoformat(state["last_sync_ts"]) - SYNC_STATE_MARGIN).isoformat(timespec="seconds")
+        log.info(f"Using sync state {state_path}: {len(state['dins'])} cached DINs, fetching rows created since {since}")
+        try:
+            row_uids = fetch_existing_row_uids(
+                supabase_url,
+                service_role_key,
+                table_name,
+                source_filter="HC",
+                since=since,
+                session=session,
+            )
+            cached_dins = state["dins"]
+        except RuntimeError as exc:
+            log.warning(f"WARNING: Incremental fetch failed, falling back to a full fetch: {exc}")
+    if row_uids is None:
+        row_uids = fetch_existing_row_uids(
+            supabase_url,
+            service_role_key,
+            table_name,
+            source_filter="HC",
+            session=session,
+        )
     
-    import time as time_module
-    print(
-        f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] 📊 Summary:",
-        flush=True
+    # Keep only the interned DIN part of "HC:<DIN>": smaller keys, and the
+    # new-record filter can probe with the scraped DIN without building a row_uid.
+    return frozenset(
+        sys.intern(din)
+        for din in (*cached_dins, *(uid[3:] for uid in row_uids if uid.startswith("HC:")))
     )
-    print(
-        f"  • Total products scraped: {len(products)}",
-        flush=True
-    )
-    print(
-        f"  • Already in Supabase: {len(existing_row_uids)}",
-        flush=True
-    )
-    print(
-        f"  • New products to insert: {len(new_products)}",
-        flush=True
-    )
-    
-    if not new_products:
-        print("No new products to sync.", flush=True)
-        return [], []
-    
-    # Map to nexara format
-    mapped_rows = []
-    for product in new_products:
-        mapped = map_dpd_product_to_nexara_format(product)
-        if mapped:  # Only add if mapping succeeded (has DIN)
-            mapped_rows.append(mapped)
-    
-    # Get all column names from the first record (all should have same structure)
-    if mapped_rows:
-        columns = list(mapped_rows[0].keys())
-    else:
-        columns = []
-    
-    return mapped_rows, columns
 
 
 def sync_new_records(
-    products: List[Dict[str, str]],
+    products: Iterable[Dict[str, str]],
     supabase_url: str,
     service_role_key: str,
     table_name: str,
-    batch_size: int = 500,
-) -> None:
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    state_path: Optional[Path] = None,
+    mode: str = "prefilter",
+    db_url: Optional[str] = None,
+    insert_concurrency: int = DEFAULT_INSERT_CONCURRENCY,
+    body_format: str = "json",
+    existing_dins: Optional[frozenset[str]] = None,
+    batch_bytes: Optional[int] = None,
+) -> int:
     """
     Sync only new product records to Supabase nexara_all_source table.
+    'products' may be a list or a generator (e.g. iter_full_scrape): rows are
+    filtered, mapped and inserted batch by batch as they arrive, so the full
+    product set is never copied. Returns the number of products seen.
+
+    With 'state_path', the known DINs are cached between runs and only rows
+    created since the previous run (minus SYNC_STATE_MARGIN) are fetched; a
+    missing or unreadable state file falls back to the full fetch. Pass
+    'existing_dins' when the caller already fetched them (see main()).
+
+    mode="upsert" skips the existing-row fetch altogether and sends every
+    product with ignore-duplicates on row_uid, letting Postgres drop the ones
+    it already has ('state_path' is not used then).
+
+    With 'db_url' (a Postgres connection string), rows are loaded with COPY
+    over a direct connection instead of PostgREST; if psycopg is missing or
+    the connection fails, the REST path is used.
+
+    'insert_concurrency' is the number of REST batches in flight at once, and
+    'body_format' ("json" or "csv") the encoding of each REST batch, and
+    'batch_bytes' an optional cap on each REST batch's JSON size.
     """
-    import time as time_module
+    log_banner("Starting Supabase sync process...")
     
-    print("=" * 80, flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Starting Supabase sync process...", flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Total products scraped: {len(products)}", flush=True)
-    print("=" * 80, flush=True)
-    
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Fetching existing row_uids from Supabase...", flush=True)
-    existing_row_uids = fetch_existing_row_uids(
-        supabase_url,
-        service_role_key,
-        table_name,
-        source_filter="HC",
-    )
-    
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Found {len(existing_row_uids)} existing records in Supabase", flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Filtering and mapping new products...", flush=True)
-    mapped_rows, columns = products_to_nexara_rows(products, existing_row_uids)
-    
-    if not mapped_rows:
-        print("=" * 80, flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] No new records to sync.", flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] All {len(products)} scraped records already exist in Supabase.", flush=True)
-        print("=" * 80, flush=True)
-        return
+    sync_ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    # One keep-alive session for the existing-row fetch and every insert batch,
+    # so the TLS connections opened for the fetch are reused by the POSTs.
+    http = make_session(max(16, insert_concurrency))
+    if mode == "upsert":
+        # Postgres drops duplicates on the row_uid unique index; nothing to download
+        log.info("Upsert mode: skipping existing row_uid fetch (duplicates ignored server-side)")
+        existing_dins = frozenset()
+    elif existing_dins is None:
+        log.info("Fetching existing row_uids from Supabase...")
+        existing_dins = fetch_existing_dins(supabase_url, service_role_key, table_name, state_path, session=http)
+        log.info(f"Found {len(existing_dins)} existing records in Supabase")
     
     # Note: We don't create the table automatically for nexara_all_source
     # as it likely has a complex schema with many columns and constraints.
     # The table should already exist. If it doesn't, the insert will fail
     # and the user will need to create it manually.
     
-    # Convert to format suitable for insertion (ensure all columns are present)
-    # The mapped_rows already have the correct format (Dict[str, Optional[str]])
-    # We just need to ensure all rows have the same columns in the same order
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Preparing {len(mapped_rows)} new records for insertion...", flush=True)
-    normalized_rows = []
-    for row in mapped_rows:
-        # Ensure all columns are present, fill missing ones with empty string
-        normalized_row: Dict[str, Optional[str]] = {}
-        for col in columns:
-            value = row.get(col)
-            # Convert None to empty string, convert other values to string
-            if value is None:
-                normalized_row[col] = ""
-            else:
-                normalized_row[col] = str(value)
-        normalized_rows.append(normalized_row)
+    counts = {"scraped": 0, "new": 0, "repeated": 0}
+    # DINs sent this run: a DIN repeated in the stream (e.g. a checkpoint that
+    # overlaps rows already streamed) is dropped before it is mapped or POSTed
+    inserted_dins: Set[str] = set()
     
-    print("=" * 80, flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Inserting {len(normalized_rows)} new records to Supabase...", flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Using batch size: {batch_size}", flush=True)
-    print("=" * 80, flush=True)
+    def new_rows() -> Iterator[Dict[str, Optional[str]]]:
+        # Mapped rows are copies of _ROW_TEMPLATE: every column present, in the
+        # same order, with string values, so they go to insert_batches as-is.
+        for product in products:
+            counts["scraped"] += 1
+            din = product.get("DIN", "").strip()
+            if not din or din in existing_dins:
+                continue  # Skip products without DIN or already in Supabase
+            if din in inserted_dins:
+                counts["repeated"] += 1
+                continue
+            counts["new"] += 1
+            inserted_dins.add(din)
+            yield map_dpd_product_to_nexara_format(product, din)
     
-    sync_start_time = time_module.time()
-    insert_batches(
-        supabase_url,
-        service_role_key,
-        table_name,
-        normalized_rows,
-        batch_size=batch_size,
-    )
+    log_banner("Streaming new records to Supabase...", f"Using batch size: {batch_size}")
+    
+    sync_start_time = time.time()
+    conn = connect_pg(db_url) if db_url else None
+    if conn is not None:
+        log.info("Loading through direct Postgres COPY")
+        with conn:
+            copy_batches(conn, table_name, _COLUMNS, new_rows(), batch_size=batch_size)
+    else:
+        insert_batches(
+            supabase_url,
+            service_role_key,
+            table_name,
+            new_rows(),
+            batch_size=batch_size,
+            on_conflict="row_uid",  # also makes retried POSTs idempotent
+            # rows are already filtered against the existing DINs, so a conflict
+            # here is a replayed POST or a stale cache: keep the stored row
+            # (ON CONFLICT DO NOTHING) rather than rewriting it in place
+            ignore_duplicates=True,
+            concurrency=insert_concurrency,
+            session=http,
+            body_format=body_format,
+            batch_bytes=batch_bytes,
+        )
+    sync_elapsed = time.time() - sync_start_time
+    
+    if state_path and mode != "upsert":
+        save_sync_state(state_path, existing_dins | inserted_dins, sync_ts)
+        log.info(f"Saved sync state to {state_path}")
+    
+    summary = ["📊 Summary:", f"  • Total products scraped: {counts['scraped']}"]
+    if mode == "upsert":
+        summary.append(f"  • Products sent (existing ones ignored server-side): {counts['new']}")
+    else:
+        summary.append(f"  • Already in Supabase: {len(existing_dins)}")
+        summary.append(f"  • New products inserted: {counts['new']}")
+    if counts["repeated"]:
+        summary.append(f"  • Repeated DINs dropped in-stream: {counts['repeated']}")
+    summary.append(RULE)
+    if not counts["new"]:
+        summary.append("No new records to sync.")
+        summary.append(f"All {counts['scraped']} scraped records already exist in Supabase.")
+    else:
+        summary.append(f"✅ Successfully synced {counts['new']} new records to Supabase!")
+        summary.append(f"Scrape + insertion took {sync_elapsed:.1f}s ({sync_elapsed/60:.1f} minutes)")
+    log.info("\n".join((*summary, RULE)))
+    return counts["scraped"]
+
+
+# Project URL as shown in the Supabase dashboard (trailing slash tolerated)
+_SUPABASE_URL_RE = re.compile(r"^https://[a-z0-9-]+\.supabase\.co/?$")
+
+
+def _validate_credentials(url: Optional[str], key: Optional[str], *, verbose: bool = False) -> None:
+    """
+    Exit on missing/empty credentials; fold format problems into one warning
+    line. The credential details are only echoed with --verbose.
+    """
+    if not url or not key:
+        sys.exit(
+            "ERROR: Supabase URL and service role key must be provided via arguments or environment variables.\n"
+            "Please set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in GitHub Actions secrets."
+        )
+    if not url.strip() or not key.strip():
+        sys.exit(
+            "ERROR: Supabase URL or service role key is empty.\n"
+            "Please check your GitHub Actions secrets: SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY"
+        )
+    
+    problems = []
+    if not _SUPABASE_URL_RE.match(url.strip()):
+        problems.append(f"URL format looks incorrect ({url[:50]}...)")
+    if not key.startswith("eyJ"):
+        # Service role keys are JWTs; the 'anon' key is the usual mix-up
+        problems.append("service role key should be a JWT starting with 'eyJ' (not the 'anon' key)")
+    if problems:
+        log.warning(f"WARNING: Supabase {'; '.join(problems)}")
     
-    sync_elapsed = time_module.time() - sync_start_time
-    print("=" * 80, flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Successfully synced {len(normalized_rows)} new records to Supabase!", flush=True)
-    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Insertion took {sync_elapsed:.1f}s ({sync_elapsed/60:.1f} minutes)", flush=True)
-    print("=" * 80, flush=True)
+    if verbose:
+        # Show first few characters for debugging (safe to show)
+        log.info(f"Supabase URL: {url}")
+        log.info(f"Service Role Key (first 20 chars): {key[:20]}...")
+        log.info(f"Service Role Key length: {len(key)} characters")
 
 
 def parse_args() -> argparse.Namespace:
@@ -289,6 +405,15 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Fetch the entire dataset (overrides --limit).",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=(
+            "Detail pages fetched in parallel during the scrape "
+            "(default: SCRAPER_DETAIL_WORKERS env var, else 4)."
+        ),
+    )
     parser.add_argument(
         "--table-name",
         default="nexara_all_source",
@@ -307,8 +432,40 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=500,
-        help="Number of rows per insert batch (default: 500).",
+        default=DEFAULT_BATCH_SIZE,
+        help=(
+            f"Number of rows per insert batch (default: {DEFAULT_BATCH_SIZE}). PostgREST "
+            "receives each batch as one JSON body, so Postgres' 65535 bind-parameter "
+            "limit does not apply; the practical ceiling is the request body size."
+        ),
+    )
+    parser.add_argument(
+        "--batch-bytes",
+        type=int,
+        default=0,
+        help=(
+            "Also cut an insert batch before its JSON exceeds this many bytes, whichever "
+            "of --batch-size/--batch-bytes comes first (default: 0 = no byte cap). "
+            "Supabase's gateway rejects very large bodies; ~2000000 is a safe cap."
+        ),
+    )
+    parser.add_argument(
+        "--insert-concurrency",
+        type=int,
+        default=DEFAULT_INSERT_CONCURRENCY,
+        help=(
+            f"Insert batches POSTed in parallel (default: {DEFAULT_INSERT_CONCURRENCY}). "
+            "Keep it modest to stay under Supabase's rate limits."
+        ),
+    )
+    parser.add_argument(
+        "--body-format",
+        choices=("json", "csv"),
+        default="json",
+        help=(
+            "Encoding of each REST insert batch (default: json). csv sends column "
+            "names once per batch instead of once per row."
+        ),
     )
     parser.add_argument(
         "--max-retries",
@@ -328,6 +485,38 @@ def parse_args() -> argparse.Namespace:
         default=100,
         help="Print progress every N processed records (default: 100).",
     )
+    parser.add_argument(
+        "--mode",
+        choices=("prefilter", "upsert"),
+        default="prefilter",
+        help=(
+            "prefilter: download existing row_uids and only send new products; "
+            "upsert: send every product and let Postgres ignore duplicates on row_uid "
+            "(cheaper once the table is large and few rows are new). Default: prefilter."
+        ),
+    )
+    parser.add_argument(
+        "--direct-pg",
+        action="store_true",
+        help=(
+            "Bulk load with COPY over a direct Postgres connection (SUPABASE_DB_URL, "
+            "requires psycopg) instead of PostgREST; falls back to REST if unavailable."
+        ),
+    )
+    parser.add_argument(
+        "--sync-state",
+        type=Path,
+        default=None,
+        help=(
+            "JSON file caching known DINs between runs; when present only rows "
+            "created since the last run are fetched from Supabase (default: off)."
+        ),
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print Supabase credential diagnostics (URL, key prefix and length) at startup.",
+    )
     parser.add_argument(
         "--output-dir",
         type=Path,
@@ -339,37 +528,15 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> None:
     args = parse_args()
+    configure_logging()
     
-    if not args.supabase_url or not args.service_role_key:
-        sys.exit(
-            "ERROR: Supabase URL and service role key must be provided via arguments or environment variables.\n"
-            "Please set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in GitHub Actions secrets."
-        )
-    
-    # Validate that the keys are not empty strings
-    if args.supabase_url.strip() == "" or args.service_role_key.strip() == "":
-        sys.exit(
-            "ERROR: Supabase URL or service role key is empty.\n"
-            "Please check your GitHub Actions secrets: SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY"
-        )
-    
-    # Validate URL format
-    if not args.supabase_url.startswith("https://") or ".supabase.co" not in args.supabase_url:
-        print(f"WARNING: Supabase URL format looks incorrect: {args.supabase_url[:50]}...", flush=True)
+    _validate_credentials(args.supabase_url, args.service_role_key, verbose=args.verbose)
     
-    # Validate service role key format (should start with eyJ...)
-    if not args.service_role_key.startswith("eyJ"):
-        print(
-            "WARNING: Service role key format looks incorrect. "
-            "It should start with 'eyJ' (JWT token). "
-            "Make sure you're using the 'service_role' key, not the 'anon' key.",
-            flush=True
-        )
-    
-    # Show first few characters for debugging (safe to show)
-    print(f"Supabase URL: {args.supabase_url}", flush=True)
-    print(f"Service Role Key (first 20 chars): {args.service_role_key[:20]}...", flush=True)
-    print(f"Service Role Key length: {len(args.service_role_key)} characters", flush=True)
+    db_url: Optional[str] = None
+    if args.direct_pg:
+        db_url = os.environ.get("SUPABASE_DB_URL")
+        if not db_url:
+            log.warning("WARNING: --direct-pg given but SUPABASE_DB_URL is not set; using the REST insert path")
     
     # Prepare scraper arguments
     limit: Optional[int] = None if args.all else args.limit
@@ -378,85 +545,59 @@ def main() -> None:
     output_dir = args.output_dir
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Global variables to store scraped products (for timeout handling)
+    # Sync arguments for the timeout handler
     # Using a dict to avoid UnboundLocalError with nested functions
     state = {
-        'scraped_products': [],
         'sync_args': None
     }
     
     def timeout_handler(signum, frame):
         """Handle timeout signal - sync whatever we've scraped so far"""
-        import time as time_module
-        import glob
-        import csv
-        
-        print("=" * 80, flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ⚠️  TIMEOUT DETECTED - Syncing partial results...", flush=True)
-        
-        products_to_sync = state['scraped_products'].copy() if state['scraped_products'] else []
-        
-        # If scraper hasn't finished, try to load from checkpoints
-        if not products_to_sync:
-            checkpoint_dir = os.getenv("SCRAPER_CHECKPOINT_DIR", "artifacts/checkpoints")
-            checkpoint_pattern = os.path.join(checkpoint_dir, "dpd_*.csv")
-            checkpoint_files = glob.glob(checkpoint_pattern)
-            
-            if checkpoint_files:
-                # Get the latest checkpoint file
-                latest_checkpoint = max(checkpoint_files, key=os.path.getmtime)
-                print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Loading products from latest checkpoint: {latest_checkpoint}", flush=True)
-                
-                try:
-                    with open(latest_checkpoint, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        products_to_sync = list(reader)
-                    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Loaded {len(products_to_sync)} products from checkpoint", flush=True)
-                except Exception as e:
-                    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Error reading checkpoint: {e}", flush=True)
+        log_banner("⚠️  TIMEOUT DETECTED - Syncing partial results...")
         
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Products to sync: {len(products_to_sync)}", flush=True)
+        # Products are streamed into Supabase, so recover from the latest checkpoint
+        # (duplicates of anything already inserted are filtered by row_uid). The
+        # checkpoint is read row by row straight into the sync, never as a list.
+        # Only enriched checkpoints qualify: list-phase rows lack the detail fields.
+        checkpoint_dir = os.getenv("SCRAPER_CHECKPOINT_DIR", "artifacts/checkpoints")
+        latest = latest_checkpoint(checkpoint_dir, phase="enriched")
         
-        if products_to_sync and state['sync_args']:
+        if latest and state['sync_args']:
+            log.info(f"Syncing products from latest checkpoint: {latest} (duplicates will be checked)...")
             try:
-                print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Syncing {len(products_to_sync)} products to Supabase (duplicates will be checked)...", flush=True)
-                sync_new_records(
-                    products_to_sync,
+                scraped = sync_new_records(
+                    iter_checkpoint_rows(latest),
                     state['sync_args']['supabase_url'],
                     state['sync_args']['service_role_key'],
                     state['sync_args']['table_name'],
                     batch_size=state['sync_args']['batch_size'],
+                    state_path=state['sync_args']['state_path'],
+                    mode=state['sync_args']['mode'],
+                    db_url=state['sync_args']['db_url'],
+                    insert_concurrency=state['sync_args']['insert_concurrency'],
+                    body_format=state['sync_args']['body_format'],
+                    batch_bytes=state['sync_args']['batch_bytes'],
                 )
-                print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Partial sync completed successfully!", flush=True)
+                log.info(f"✅ Partial sync completed successfully! ({scraped} products from checkpoint)")
             except Exception as e:
-                print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ❌ Error during partial sync: {e}", flush=True)
-                import traceback
-                traceback.print_exc()
+                log.exception(f"❌ Error during partial sync: {e}")
         else:
-            print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] No products to sync or sync args not set", flush=True)
+            log.info("No checkpoint to sync or sync args not set")
         
-        print("=" * 80, flush=True)
+        log.info(RULE)
         sys.exit(0)
     
     # Register signal handler for SIGTERM (GitHub Actions sends this on timeout)
     signal.signal(signal.SIGTERM, timeout_handler)
     
     try:
-        print("=" * 80, flush=True)
-        print("Starting DPD product scrape...", flush=True)
-        print("=" * 80, flush=True)
+        log_banner("Starting DPD product scrape...")
         
-        # Import DPD scraper
-        import time as time_module
-        from dpd_scraper.dpd_scraper import run_full_scrape
+        start_time = time.time()
         
-        start_time = time_module.time()
-        # Set maximum scrape time to 5.5 hours (leaving 30 minutes buffer for sync)
-        MAX_SCRAPE_TIME = 5.5 * 60 * 60  # 5.5 hours in seconds
-        
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Starting DPD scrape (this may take a while)...", flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Maximum scrape time: {MAX_SCRAPE_TIME/3600:.1f} hours (will auto-sync on timeout)", flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Fetching all products from Health Canada Drug Product Database...", flush=True)
+        log.info("Starting DPD scrape (this may take a while)...")
+        log.info("Records are synced as they are scraped (checkpoints are synced on timeout)")
+        log.info("Fetching all products from Health Canada Drug Product Database...")
         
         # Run the DPD scraper
         # Set max_rows to limit if provided, otherwise 0 = no limit (all products)
@@ -470,9 +611,13 @@ def main() -> None:
         # Enable checkpoints to save progress (every 2000 rows by default)
         checkpoint_every = int(os.getenv("SCRAPER_CHECKPOINT_EVERY_ROWS", "2000"))
         
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Scraper settings: request_sleep={request_sleep}s, enrich_batch={enrich_flush_every}", flush=True)
+        detail_workers = args.concurrency or DEF_DETAIL_WORKERS
+        log.info(
+            f"Scraper settings: request_sleep={request_sleep}s, enrich_batch={enrich_flush_every}, "
+            f"detail_workers={detail_workers}"
+        )
         if checkpoint_every > 0:
-            print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Checkpoints enabled: saving progress every {checkpoint_every} rows", flush=True)
+            log.info(f"Checkpoints enabled: saving progress every {checkpoint_every} rows")
         
         # Store sync arguments for timeout handler
         state['sync_args'] = {
@@ -480,65 +625,58 @@ def main() -> None:
             'service_role_key': args.service_role_key,
             'table_name': args.table_name,
             'batch_size': args.batch_size,
+            'state_path': args.sync_state,
+            'mode': args.mode,
+            'db_url': db_url,
+            'insert_concurrency': args.insert_concurrency,
+            'body_format': args.body_format,
+            'batch_bytes': args.batch_bytes,
         }
         
-        # Run scraper in a way that allows periodic sync
-        # Check time periodically and sync if approaching timeout
-        MAX_SCRAPE_TIME = 5.5 * 60 * 60  # 5.5 hours
+        # Known DINs are fetched before scraping so their detail pages are
+        # skipped; after the first backfill that is almost every product.
+        existing_dins: Optional[frozenset[str]] = None
+        if args.mode != "upsert":
+            log.info("Fetching existing row_uids from Supabase...")
+            existing_dins = fetch_existing_dins(
+                args.supabase_url, args.service_role_key, args.table_name, args.sync_state
+            )
+            log.info(f"Found {len(existing_dins)} existing records in Supabase (detail pages skipped for these)")
         
-        products, meta = run_full_scrape(
+        # Scrape → map → insert as one streaming pipeline: enriched rows flow
+        # straight into insert batches instead of being collected first.
+        products = iter_full_scrape(
             max_depth=1,
             target_min_rows=1000,  # Minimum rows to collect
             enrich_flush_every=enrich_flush_every,
             request_sleep=request_sleep,  # Optimized for speed
             max_rows=max_rows,
+            skip_dins=existing_dins,
+            detail_workers=detail_workers,
         )
-        
-        # Check if we're approaching timeout and sync what we have
-        elapsed = time_module.time() - start_time
-        if elapsed >= MAX_SCRAPE_TIME:
-            print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ⚠️  Approaching timeout ({elapsed/3600:.1f}h elapsed), syncing partial results...", flush=True)
-            state['scraped_products'] = products
-            if products and state['sync_args']:
-                try:
-                    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Syncing {len(products)} products before timeout...", flush=True)
-                    sync_new_records(
-                        products,
-                        state['sync_args']['supabase_url'],
-                        state['sync_args']['service_role_key'],
-                        state['sync_args']['table_name'],
-                        batch_size=state['sync_args']['batch_size'],
-                    )
-                    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Partial sync completed before timeout!", flush=True)
-                    # Exit successfully after partial sync
-                    sys.exit(0)
-                except Exception as e:
-                    print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] ❌ Error during partial sync: {e}", flush=True)
-        
-        # Store products for timeout handler (in case timeout happens during sync)
-        state['scraped_products'] = products
-        
-        elapsed = time_module.time() - start_time
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Scrape completed in {elapsed:.1f}s ({elapsed/60:.1f} minutes)", flush=True)
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Scraped {len(products)} products", flush=True)
-        
-        if not products:
-            raise ScraperError("No products scraped from DPD")
-        
-        print(f"[{time_module.strftime('%Y-%m-%d %H:%M:%S')}] Syncing products to Supabase...", flush=True)
-        sync_new_records(
+        scraped = sync_new_records(
             products,
             args.supabase_url,
             args.service_role_key,
             args.table_name,
             batch_size=args.batch_size,
+            state_path=args.sync_state,
+            mode=args.mode,
+            db_url=db_url,
+            insert_concurrency=args.insert_concurrency,
+            body_format=args.body_format,
+            existing_dins=existing_dins,
+            batch_bytes=args.batch_bytes,
         )
         
-        total_elapsed = time_module.time() - start_time
-        print("=" * 80, flush=True)
-        print(f"Monthly sync completed successfully!", flush=True)
-        print(f"Total time: {total_elapsed:.1f}s ({total_elapsed/60:.1f} minutes)", flush=True)
-        print("=" * 80, flush=True)
+        if not scraped:
+            raise ScraperError("No products scraped from DPD")
+        
+        total_elapsed = time.time() - start_time
+        log_banner(
+            "Monthly sync completed successfully!",
+            f"Total time: {total_elapsed:.1f}s ({total_elapsed/60:.1f} minutes)",
+        )
         
     except ScraperError as exc:
         sys.exit(f"Scraper failed: {exc}")
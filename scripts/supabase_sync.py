@@ -8,22 +8,72 @@ from __future__ import annotations
 
 import argparse
 import csv
-import json
+import gzip
+import io
+import logging
 import os
 import sys
+import threading
 import time
 from pathlib import Path
+from queue import Queue
 from typing import Dict, Iterable, List, Optional
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 DEFAULT_TABLE_NAME = "drug_inspections"
+# Rows per PostgREST insert. 500 spent most of the sync in per-request overhead.
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_INSERT_CONCURRENCY = 4  # concurrent insert POSTs; kept low to stay inside Supabase rate limits
+HTTP_RETRIES = int(os.environ.get("SUPABASE_HTTP_RETRIES", "4"))  # per request, on 429/5xx
+# gzip insert bodies (Content-Encoding: gzip). Off by default: only enable it when
+# the gateway in front of PostgREST decodes compressed request bodies.
+GZIP_BODY = os.environ.get("SUPABASE_GZIP_BODY", "0").strip().lower() in ("1", "true", "yes")
 SQL_RPC_PATH = "rest/v1/rpc/sql"
 
 
+log = logging.getLogger("supabase_sync")
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Timestamped progress lines on stdout, one "[YYYY-mm-dd HH:MM:SS] msg" record each."""
+    logging.basicConfig(
+        level=level,
+        format="[%(asctime)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        stream=sys.stdout,
+        force=True,
+    )
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """
+    Session with a connection pool large enough for the concurrent insert
+    threads. Rate-limited (429) and transient 5xx responses are retried with
+    exponential backoff, honouring Retry-After. POSTs are retried too: a
+    batch is one transaction, and callers pass on_conflict so a replay after
+    a lost response is resolved on the unique key instead of duplicating rows.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=1.0,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 def load_mapping(mapping_path: Path) -> Dict[str, str]:
-    with mapping_path.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
+    data = orjson.loads(mapping_path.read_bytes())  # bytes in, no str decode pass
     # Ensure deterministic ordering
     ordered = {k: data[k] for k in data}
     return ordered
@@ -35,6 +85,7 @@ def run_sql(
     query: str,
     *,
     raise_for_status: bool = True,
+    session: Optional[requests.Session] = None,
 ) -> requests.Response:
     endpoint = f"{url.rstrip('/')}/{SQL_RPC_PATH}"
     headers = {
@@ -42,7 +93,7 @@ def run_sql(
         "Authorization": f"Bearer {service_role_key}",
         "Content-Type": "application/json",
     }
-    response = requests.post(endpoint, headers=headers, json={"query": query})
+    response = (session or requests).post(endpoint, headers=headers, json={"query": query})
     if raise_for_status:
         try:
             response.raise_for_status()
@@ -56,6 +107,7 @@ def create_table(
     service_role_key: str,
     table_name: str,
     columns: Iterable[str],
+    session: Optional[requests.Session] = None,
 ) -> None:
     cols_sql: List[str] = []
     for column in columns:
@@ -69,43 +121,90 @@ def create_table(
         f'CREATE TABLE public."{table_name}" ('
         f'{", ".join(cols_sql)}, PRIMARY KEY ("inspection_number"));'
     )
-    print("Dropping table if exists…", flush=True)
-    run_sql(url, service_role_key, drop_sql)
-    print("Creating table…", flush=True)
-    run_sql(url, service_role_key, create_sql)
+    # one RPC round trip for both statements
+    log.info("Dropping table if exists and creating it…")
+    run_sql(url, service_role_key, f"{drop_sql} {create_sql}", session=session)
 
 
-def chunked(iterable: Iterable[Dict[str, Optional[str]]], size: int) -> Iterable[List[Dict[str, Optional[str]]]]:
+def chunked(
+    iterable: Iterable[Dict[str, Optional[str]]],
+    size: int,
+    max_bytes: Optional[int] = None,
+) -> Iterable[List[Dict[str, Optional[str]]]]:
+    """
+    Batches of at most 'size' rows. With 'max_bytes', a batch is also cut
+    before its rows' JSON encoding would exceed that many bytes (a row larger
+    than the cap still goes out, alone).
+    """
     batch: List[Dict[str, Optional[str]]] = []
+    batch_bytes = 0
     for item in iterable:
+        if max_bytes:
+            item_bytes = len(orjson.dumps(item)) + 1  # + separator
+            if batch and batch_bytes + item_bytes > max_bytes:
+                yield batch
+                batch, batch_bytes = [], 0
+            batch_bytes += item_bytes
         batch.append(item)
         if len(batch) >= size:
             yield batch
-            batch = []
+            batch, batch_bytes = [], 0
     if batch:
         yield batch
 
 
+def _csv_field(value: object) -> str:
+    """One CSV field: None → bare NULL; strings always quoted, so the text "NULL" stays text."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def csv_body(batch: List[Dict[str, Optional[str]]]) -> bytes:
+    """
+    Encode a batch as a PostgREST CSV bulk-insert body: one header line with
+    the column names, then positional values. PostgREST reads an empty field
+    as "" and only the bare word NULL as SQL null, so None is written as an
+    unquoted NULL and every string is quoted: a text value "NULL" stays text
+    (see _csv_field).
+    """
+    cols = list(batch[0]) if batch else []
+    lines = [",".join(map(_csv_field, cols))]
+    lines.extend(",".join([_csv_field(row.get(c)) for c in cols]) for row in batch)
+    lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
 def normalize_row(row: Dict[str, str]) -> Dict[str, Optional[str]]:
-    normalized: Dict[str, Optional[str]] = {}
-    for key, value in row.items():
-        if value == "":
-            normalized[key] = None
-        elif key == "inspection_number":
-            try:
-                normalized[key] = int(value)  # type: ignore[assignment]
-            except ValueError:
-                normalized[key] = None
-        else:
-            normalized[key] = value
+    # "" → None for every cell in one comprehension, then the one typed column
+    normalized: Dict[str, Optional[str]] = {key: value or None for key, value in row.items()}
+    ins_number = normalized.get("inspection_number")
+    if ins_number is not None:
+        try:
+            normalized["inspection_number"] = int(ins_number)  # type: ignore[assignment]
+        except ValueError:
+            normalized["inspection_number"] = None
     return normalized
 
 
 def load_rows(csv_path: Path) -> Iterable[Dict[str, Optional[str]]]:
+    # csv.reader + dict(zip()) builds each row in C; DictReader does the same
+    # zip from Python code. Ragged rows get DictReader's padding (None) so
+    # every row still carries every header key.
     with csv_path.open("r", encoding="utf-8") as fh:
-        reader = csv.DictReader(fh)
-        for row in reader:
-            yield normalize_row(row)
+        reader = csv.reader(fh)
+        fields = next(reader, None)
+        if not fields:
+            return
+        width = len(fields)
+        for rec in reader:
+            if not rec:
+                continue  # DictReader skips blank lines too
+            if len(rec) < width:
+                rec += [None] * (width - len(rec))  # type: ignore[list-item]
+            yield normalize_row(dict(zip(fields, rec)))
 
 
 def fetch_existing_row_uids(
@@ -113,59 +212,72 @@ def fetch_existing_row_uids(
     service_role_key: str,
     table_name: str,
     source_filter: Optional[str] = None,
+    since: Optional[str] = None,
+    session: Optional[requests.Session] = None,
 ) -> set[str]:
     """
     Fetch all existing row_uid values from Supabase table.
-    Optionally filter by source (e.g., "HC_INSPECTIONS").
+    Optionally filter by source (e.g., "HC_INSPECTIONS") and, with 'since'
+    (ISO timestamp), only rows whose created_at is at or after it.
+    Pages share 'session' (or a fresh pooled one), so the listing runs over
+    one keep-alive connection rather than a new TLS handshake per page.
     Returns a set of row_uid values for fast lookup.
     """
+    http = session or make_session()
     endpoint = f"{url.rstrip('/')}/rest/v1/{table_name}"
     headers = {
         "apikey": service_role_key,
         "Authorization": f"Bearer {service_role_key}",
         "Content-Type": "application/json",
+        # one bare uid per line instead of a {"row_uid": ...} object per row;
+        # requests already asks for (and undoes) gzip transfer encoding
+        "Accept": "text/csv",
     }
     
-    # Use select query to get only row_uid column
+    # Use select query to get only row_uid column. Pages are walked by keyset
+    # (row_uid > last seen, in row_uid order) rather than OFFSET, which makes
+    # Postgres scan and discard every earlier row again on each page.
     params = {
         "select": "row_uid",
+        "order": "row_uid.asc",
     }
     
     # Add source filter if provided
     if source_filter:
         params["source"] = f"eq.{source_filter}"
+    if since:
+        params["created_at"] = f"gte.{since}"
     
     existing_row_uids: set[str] = set()
-    offset = 0
+    cursor: Optional[str] = None
     limit = 1000  # Fetch in batches
+    params["limit"] = limit  # only the cursor filter changes from page to page
     
     while True:
-        params_with_offset = {**params, "offset": offset, "limit": limit}
+        if cursor is not None:
+            params["row_uid"] = f"gt.{cursor}"
         
         try:
-            response = requests.get(endpoint, headers=headers, params=params_with_offset, timeout=60)
+            response = http.get(endpoint, headers=headers, params=params, timeout=60)
             response.raise_for_status()
-            data = response.json()
+            # header line, then one (csv-quoted if needed) uid per line; NULL is an empty field
+            data = [rec[0] if rec else "" for rec in csv.reader(io.StringIO(response.text))][1:]
             
-            if not data or not isinstance(data, list):
+            if not data:
                 break
                 
-            for row in data:
-                if isinstance(row, dict) and "row_uid" in row:
-                    row_uid = row["row_uid"]
-                    if row_uid is not None:
-                        existing_row_uids.add(str(row_uid))
+            existing_row_uids.update(uid for uid in data if uid)
             
-            # If we got fewer results than the limit, we've reached the end
-            if len(data) < limit:
+            # If we got fewer results than the limit, we've reached the end;
+            # nulls sort last, so a null cursor means no keyed rows remain
+            cursor = data[-1] or None
+            if len(data) < limit or cursor is None:
                 break
-                
-            offset += limit
             
         except requests.HTTPError as exc:
             # If table doesn't exist yet, return empty set
             if exc.response is not None and exc.response.status_code == 404:
-                print("Table does not exist yet, will create it.", flush=True)
+                log.info("Table does not exist yet, will create it.")
                 return set()
             # Check for authentication errors
             if exc.response is not None and exc.response.status_code == 401:
@@ -180,7 +292,7 @@ def fetch_existing_row_uids(
                 f"Failed fetching existing row_uids: {error_text}"
             ) from exc
     
-    print(f"Found {len(existing_row_uids)} existing row_uids in Supabase.", flush=True)
+    log.info(f"Found {len(existing_row_uids)} existing row_uids in Supabase.")
     return existing_row_uids
 
 
@@ -188,12 +300,14 @@ def fetch_existing_inspection_numbers(
     url: str,
     service_role_key: str,
     table_name: str,
+    session: Optional[requests.Session] = None,
 ) -> set[int]:
     """
     Fetch all existing inspection numbers from Supabase table.
     Returns a set of inspection numbers for fast lookup.
     DEPRECATED: Use fetch_existing_row_uids instead for nexara_all_source table.
     """
+    http = session or make_session()
     endpoint = f"{url.rstrip('/')}/rest/v1/{table_name}"
     headers = {
         "apikey": service_role_key,
@@ -201,22 +315,26 @@ def fetch_existing_inspection_numbers(
         "Content-Type": "application/json",
     }
     
-    # Use select query to get only inspection_number column
+    # Use select query to get only inspection_number column, keyset-paged
+    # like fetch_existing_row_uids
     params = {
         "select": "inspection_number",
+        "order": "inspection_number.asc",
     }
     
     existing_numbers: set[int] = set()
-    offset = 0
+    cursor: Optional[int] = None
     limit = 1000  # Fetch in batches
+    params["limit"] = limit  # only the cursor filter changes from page to page
     
     while True:
-        params_with_offset = {**params, "offset": offset, "limit": limit}
+        if cursor is not None:
+            params["inspection_number"] = f"gt.{cursor}"
         
         try:
-            response = requests.get(endpoint, headers=headers, params=params_with_offset, timeout=60)
+            response = http.get(endpoint, headers=headers, params=params, timeout=60)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if not data or not isinstance(data, list):
                 break
@@ -228,22 +346,21 @@ def fetch_existing_inspection_numbers(
                         existing_numbers.add(int(ins_num))
             
             # If we got fewer results than the limit, we've reached the end
-            if len(data) < limit:
+            cursor = data[-1].get("inspection_number") if isinstance(data[-1], dict) else None
+            if len(data) < limit or cursor is None:
                 break
-                
-            offset += limit
             
         except requests.HTTPError as exc:
             # If table doesn't exist yet, return empty set
             if exc.response is not None and exc.response.status_code == 404:
-                print("Table does not exist yet, will create it.", flush=True)
+                log.info("Table does not exist yet, will create it.")
                 return set()
             error_text = exc.response.text if exc.response is not None else str(exc)
             raise RuntimeError(
                 f"Failed fetching existing inspection numbers: {error_text}"
             ) from exc
     
-    print(f"Found {len(existing_numbers)} existing inspection numbers in Supabase.", flush=True)
+    log.info(f"Found {len(existing_numbers)} existing inspection numbers in Supabase.")
     return existing_numbers
 
 
@@ -253,48 +370,245 @@ def insert_batches(
     table_name: str,
     rows: Iterable[Dict[str, Optional[str]]],
     *,
-    batch_size: int = 500,
-) -> None:
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_INSERT_CONCURRENCY,
+    session: Optional[requests.Session] = None,
+    on_conflict: Optional[str] = None,
+    ignore_duplicates: bool = False,
+    body_format: str = "json",
+    batch_bytes: Optional[int] = None,
+    compress: bool = GZIP_BODY,
+) -> int:
+    """
+    POST rows to PostgREST in batches of 'batch_size', cut earlier when
+    'batch_bytes' is set and a batch's JSON would outgrow it (wide rows stay
+    under the gateway's body limit). body_format="csv" sends
+    each batch as text/csv (see csv_body) instead of a JSON array, so column
+    names are sent once per batch rather than once per row. With 'compress'
+    each body is gzip'd (level 1) before it goes out. A batch the
+    gateway rejects as too large (413) is halved and resent, and later
+    batches are sent in parts of that size.
+
+    Batches go out 'concurrency' at a time. Under merge-duplicates (the
+    default) a key that repeats across batches is still applied in input
+    order: see 'ordered' below.
+    """
+    if body_format not in ("json", "csv"):
+        raise ValueError(f"Unsupported body_format: {body_format!r}")
+    encode = csv_body if body_format == "csv" else orjson.dumps
     endpoint = f"{url.rstrip('/')}/rest/v1/{table_name}"
+    if on_conflict:
+        endpoint += f"?on_conflict={on_conflict}"
+    resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
     headers = {
         "apikey": service_role_key,
         "Authorization": f"Bearer {service_role_key}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates,return=minimal",
+        "Content-Type": "text/csv" if body_format == "csv" else "application/json",
+        "Prefer": f"resolution={resolution},return=minimal",
     }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
     total = 0
     start_time = time.time()
-    # Convert to list to get total count and allow iteration
-    rows_list = list(rows)
-    total_rows = len(rows_list)
-    
-    print(f"  Total rows to insert: {total_rows}", flush=True)
-    print(f"  Batch size: {batch_size}", flush=True)
-    print(f"  Estimated batches: {(total_rows + batch_size - 1) // batch_size}", flush=True)
-    
-    # Re-chunk for insertion
-    batch_num = 0
-    for batch in chunked(iter(rows_list), batch_size):
-        batch_num += 1
-        response = requests.post(endpoint, headers=headers, json=batch, timeout=60)
+    # Stream: rows may be a generator (scrape → sync pipeline), so the total is
+    # only known up front when the caller hands us a sized collection.
+    total_rows: Optional[int] = len(rows) if hasattr(rows, "__len__") else None  # type: ignore[arg-type]
+
+    if total_rows is not None:
+        log.info(f"  Total rows to insert: {total_rows}")
+    log.info(f"  Batch size: {batch_size}" + (f" (capped at {batch_bytes} bytes)" if batch_bytes else ""))
+    if total_rows is not None:
+        log.info(f"  Estimated batches: {(total_rows + batch_size - 1) // batch_size}")
+
+    concurrency = max(1, concurrency)
+    # merge-duplicates must apply duplicate keys in input order (the later row
+    # wins), which concurrent POSTs would not guarantee. With a known key, a
+    # batch that repeats a key already sent waits for every earlier batch to
+    # finish first; without one, batches are posted one at a time.
+    ordered = not ignore_duplicates
+    if ordered and not on_conflict and concurrency > 1:
+        log.info("  merge-duplicates without on_conflict: posting batches one at a time")
+        concurrency = 1
+    sent_keys: Optional[set] = set() if ordered and on_conflict and concurrency > 1 else None
+    log.info(f"  Concurrent requests: {concurrency}")
+    http = session or make_session(max(16, concurrency))
+
+    # Batches are built (and, for a generator, scraped/mapped) on the calling
+    # thread and POSTed by 'concurrency' background threads sharing one
+    # keep-alive session, so round trips overlap with each other and with
+    # producing the next batch. The queue bound keeps memory flat.
+    pending: Queue = Queue(maxsize=2 * concurrency)
+    failures: List[BaseException] = []
+    progress = threading.Lock()
+    # Rows per POST once the gateway has rejected a body as too large (413):
+    # halved on each rejection, and later batches are split up front instead
+    # of each paying for its own rejected round trip.
+    post_cap = batch_size
+
+    def _post(batch_num: int, offset: int, batch: List[Dict[str, Optional[str]]]) -> None:
+        nonlocal total, post_cap
+        cap = post_cap
+        if len(batch) > cap:
+            _post(batch_num, offset, batch[:cap])
+            _post(batch_num, offset + cap, batch[cap:])
+            return
+        # Both encoders produce bytes; Content-Type is already in headers
+        data = encode(batch)
+        if compress:
+            data = gzip.compress(data, compresslevel=1)  # repeated keys: shrinks several-fold
+        response = http.post(endpoint, headers=headers, data=data, timeout=60)
+        if response.status_code == 413 and len(batch) > 1:
+            with progress:
+                post_cap = min(post_cap, max(1, len(batch) // 2))
+            log.warning(
+                f"WARNING: Batch {batch_num} ({len(batch)} rows) too large for the gateway; "
+                f"retrying in parts of at most {post_cap} rows"
+            )
+            _post(batch_num, offset, batch)
+            return
         try:
             response.raise_for_status()
         except requests.HTTPError as exc:
             raise RuntimeError(
-                f"Failed inserting batch {batch_num} at offset {total}: {response.text}"
+                f"Failed inserting batch {batch_num} at offset {offset}: {response.text}"
             ) from exc
+        with progress:
+            total += len(batch)
+            elapsed = time.time() - start_time
+            rate = total / elapsed if elapsed > 0 else 0
+            if total_rows is not None:
+                remaining = total_rows - total
+                eta = remaining / rate if rate > 0 else 0
+                log.info(
+                    f"  ✓ Batch {batch_num}: Inserted {total}/{total_rows} rows "
+                    f"({len(batch)} in this batch, {elapsed:.1f}s elapsed, "
+                    f"{rate:.1f} rows/s, ~{eta:.0f}s remaining)"
+                )
+            else:
+                log.info(
+                    f"  ✓ Batch {batch_num}: Inserted {total} rows "
+                    f"({len(batch)} in this batch, {elapsed:.1f}s elapsed, {rate:.1f} rows/s)"
+                )
+
+    def _poster() -> None:
+        while True:
+            item = pending.get()
+            try:
+                if item is None:
+                    return
+                if failures:
+                    continue  # keep draining so the producer never blocks on dead consumers
+                _post(*item)
+            except BaseException as exc:
+                failures.append(exc)
+            finally:
+                pending.task_done()
+
+    posters = [
+        threading.Thread(target=_poster, name=f"insert-batches-{i}", daemon=True)
+        for i in range(concurrency)
+    ]
+    for poster in posters:
+        poster.start()
+    try:
+        offset = 0
+        for batch_num, batch in enumerate(chunked(rows, batch_size, batch_bytes), 1):
+            if failures:
+                break
+            if sent_keys is not None:
+                keys = {row.get(on_conflict) for row in batch}
+                if not sent_keys.isdisjoint(keys):
+                    pending.join()  # earlier rows for these keys must land first
+                sent_keys |= keys
+            pending.put((batch_num, offset, batch))
+            offset += len(batch)
+    finally:
+        for _ in posters:
+            pending.put(None)
+        for poster in posters:
+            poster.join()
+    if failures:
+        raise failures[0]
+    log.info(f"✅ All {total} rows inserted successfully!")
+    return total
+
+
+def connect_pg(db_url: str):
+    """
+    Open a direct Postgres connection for COPY loads. psycopg is optional:
+    returns None (caller falls back to PostgREST) if it is not installed or
+    the connection cannot be made.
+    """
+    try:
+        import psycopg  # optional: pip install "psycopg[binary]"
+    except ImportError:
+        log.warning("WARNING: psycopg is not installed; falling back to the REST insert path.")
+        return None
+    try:
+        return psycopg.connect(db_url)
+    except psycopg.Error as exc:
+        log.warning(f"WARNING: Direct Postgres connection failed ({exc}); falling back to the REST insert path.")
+        return None
+
+
+def copy_batches(
+    conn,
+    table_name: str,
+    columns: Iterable[str],
+    rows: Iterable[Dict[str, Optional[str]]],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    conflict_column: str = "row_uid",
+    update_existing: bool = False,
+) -> int:
+    """
+    Bulk load through COPY instead of PostgREST JSON. Each batch is copied into
+    a transaction-scoped staging table and moved over with ON CONFLICT DO
+    NOTHING, so duplicates are skipped like the REST ignore-duplicates path and
+    each committed batch survives a later failure. With 'update_existing' the
+    move is ON CONFLICT DO UPDATE over every non-key column instead, matching
+    the REST merge-duplicates upsert.
+    """
+    from psycopg import sql
+
+    cols = list(columns)
+    col_list = sql.SQL(", ").join(map(sql.Identifier, cols))
+    stage = sql.Identifier("_copy_stage")
+    create_stage = sql.SQL(
+        "CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ).format(stage, sql.Identifier(table_name))
+    copy_stage = sql.SQL("COPY {} ({}) FROM STDIN").format(stage, col_list)
+    updated = [c for c in cols if c != conflict_column]
+    if update_existing and updated:
+        resolve = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+            sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(c), sql.Identifier(c)) for c in updated
+        ))
+    else:
+        resolve = sql.SQL("DO NOTHING")
+    move_rows = sql.SQL(
+        "INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}"
+    ).format(sql.Identifier(table_name), col_list, col_list, stage, sql.Identifier(conflict_column), resolve)
+
+    total = 0
+    start_time = time.time()
+    log.info(f"  COPY batch size: {batch_size}")
+    for batch_num, batch in enumerate(chunked(rows, batch_size), 1):
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute(create_stage)
+                with cur.copy(copy_stage) as cp:
+                    for row in batch:
+                        cp.write_row([row.get(c) for c in cols])
+                cur.execute(move_rows)
         total += len(batch)
         elapsed = time.time() - start_time
         rate = total / elapsed if elapsed > 0 else 0
-        remaining = total_rows - total
-        eta = remaining / rate if rate > 0 else 0
-        print(
-            f"  ✓ Batch {batch_num}: Inserted {total}/{total_rows} rows "
-            f"({len(batch)} in this batch, {elapsed:.1f}s elapsed, "
-            f"{rate:.1f} rows/s, ~{eta:.0f}s remaining)",
-            flush=True
+        log.info(
+            f"  ✓ Batch {batch_num}: Copied {total} rows "
+            f"({len(batch)} in this batch, {elapsed:.1f}s elapsed, {rate:.1f} rows/s)"
         )
-    print(f"✅ All {total} rows inserted successfully!", flush=True)
+    log.info(f"✅ All {total} rows copied successfully!")
+    return total
 
 
 def parse_args() -> argparse.Namespace:
@@ -323,8 +637,28 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=500,
-        help="Number of rows per insert batch (default: 500).",
+        default=DEFAULT_BATCH_SIZE,
+        help=(
+            f"Number of rows per insert batch (default: {DEFAULT_BATCH_SIZE}). PostgREST "
+            "takes each batch as one JSON body, so the ceiling is the request body size."
+        ),
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_INSERT_CONCURRENCY,
+        help=(
+            f"Insert batches POSTed at once (default: {DEFAULT_INSERT_CONCURRENCY}). Higher "
+            "values hide round-trip latency but may hit Supabase rate limits."
+        ),
+    )
+    parser.add_argument(
+        "--direct-pg",
+        action="store_true",
+        help=(
+            "Bulk load with COPY over a direct Postgres connection (SUPABASE_DB_URL, "
+            "requires psycopg) instead of PostgREST; falls back to REST if unavailable."
+        ),
     )
     parser.add_argument(
         "--skip-create-table",
@@ -335,6 +669,7 @@ def parse_args() -> argparse.Namespace:
 
 
 def main() -> None:
+    configure_logging()
     args = parse_args()
 
     if not args.supabase_url or not args.service_role_key:
@@ -350,17 +685,41 @@ def main() -> None:
     mapping = load_mapping(mapping_path)
     sanitized_columns = list(mapping.values())
 
+    http = make_session(max(16, args.concurrency))
     if args.skip_create_table:
-        print("Skipping table creation step.", flush=True)
+        log.info("Skipping table creation step.")
     else:
-        create_table(args.supabase_url, args.service_role_key, args.table_name, sanitized_columns)
+        create_table(args.supabase_url, args.service_role_key, args.table_name, sanitized_columns, session=http)
     rows = load_rows(csv_path)
+    conn = None
+    if args.direct_pg:
+        db_url = os.environ.get("SUPABASE_DB_URL")
+        if db_url:
+            conn = connect_pg(db_url)
+        else:
+            log.warning("WARNING: --direct-pg given but SUPABASE_DB_URL is not set; using the REST insert path")
+    if conn is not None:
+        log.info("Loading through direct Postgres COPY")
+        with conn:
+            copy_batches(
+                conn,
+                args.table_name,
+                sanitized_columns,
+                rows,
+                batch_size=args.batch_size,
+                conflict_column="inspection_number",  # the table's primary key (see create_table)
+                update_existing=True,  # same upsert as the REST path's merge-duplicates
+            )
+        return
     insert_batches(
         args.supabase_url,
         args.service_role_key,
         args.table_name,
         rows,
         batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        session=http,
+        on_conflict="inspection_number",  # explicit key: a retried POST upserts, never duplicates
     )
 
 
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 """
-Sync partial results from checkpoint CSVs to Supabase.
+Sync partial results from checkpoint files (JSONL.gz or CSV) to Supabase.
 Used when the scraper times out (exit 124) so we still persist scraped data.
 """
 from __future__ import annotations
 
-import csv
 import os
 import sys
+from itertools import chain
 from pathlib import Path
 
 # Path setup
@@ -16,10 +16,12 @@ _root = _scripts.parent
 sys.path.insert(0, str(_root))
 sys.path.insert(0, str(_scripts))
 
-from run_monthly_sync import sync_new_records
+from run_monthly_sync import configure_logging, log, sync_new_records
+from dpd_scraper.dpd_scraper import iter_checkpoint_rows, latest_checkpoint
 
 
 def main() -> int:
+    configure_logging()
     raw = os.getenv("SCRAPER_CHECKPOINT_DIR")
     if raw:
         checkpoint_dir = Path(raw).expanduser()
@@ -28,36 +30,40 @@ def main() -> int:
     if not checkpoint_dir.is_absolute():
         checkpoint_dir = _root / checkpoint_dir
 
-    files = sorted(checkpoint_dir.glob("dpd_*.csv"), key=lambda p: p.stat().st_mtime)
-    if not files:
-        print("No checkpoint files found.", flush=True)
+    # enriched only: list-phase checkpoints lack the detail fields
+    found = latest_checkpoint(str(checkpoint_dir), prefix="dpd", phase="enriched")
+    if not found:
+        log.info("No checkpoint files found.")
         return 0
 
-    latest = files[-1]
-    print(f"Loading from {latest} ({latest.stat().st_size} bytes)", flush=True)
-    with open(latest, "r", encoding="utf-8") as f:
-        products = list(csv.DictReader(f))
-    print(f"Loaded {len(products)} products.", flush=True)
+    latest = Path(found)
+    log.info(f"Loading from {latest} ({latest.stat().st_size} bytes)")
+    # Rows are streamed from the file into the sync; only the first is read
+    # up front, to tell an empty checkpoint apart
+    rows = iter_checkpoint_rows(str(latest))
+    first = next(rows, None)
 
-    if not products:
-        print("Checkpoint empty, nothing to sync.", flush=True)
+    if first is None:
+        log.info("Checkpoint empty, nothing to sync.")
         return 0
 
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
     if not url or not key:
-        print("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set.", flush=True)
+        log.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set.")
         return 1
 
-    print("Syncing to Supabase (duplicates will be skipped)...", flush=True)
-    sync_new_records(
-        products,
+    # Same DIN cache as the scrape step, so the partial sync stays incremental
+    state_raw = os.getenv("SYNC_STATE_PATH")
+    log.info("Syncing to Supabase (duplicates will be skipped)...")
+    synced = sync_new_records(
+        chain((first,), rows),
         url,
         key,
         "nexara_all_source",
-        batch_size=500,
+        state_path=Path(state_raw) if state_raw else None,
     )
-    print("Partial sync completed successfully.", flush=True)
+    log.info(f"Partial sync completed successfully ({synced} products from checkpoint).")
     return 0
 
 